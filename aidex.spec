@@ -7,7 +7,7 @@ a = Analysis(
     pathex=['.'], 
     binaries=[],
     datas=[('icon.icns',  '.')],
-    hiddenimports=['pyotp', 'pyperclip', 'qt_material', 'PyQt5', 'AppKit'],
+    hiddenimports=['pyperclip', 'qt_material', 'PyQt5', 'AppKit', 'cryptography'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
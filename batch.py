@@ -0,0 +1,146 @@
+import sys
+import json
+import time
+import hmac
+import base64
+import struct
+import hashlib
+import binascii
+import argparse
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from config import CONFIG_FILE, TOTPConfig
+from vault import VaultError, unlock_from_terminal
+from engine import DEFAULT_INTERVAL, DEFAULT_DIGITS, DEFAULT_ALGORITHM, ALGORITHMS
+
+
+# digests computed per task, and the total size below which a process pool costs more than it saves
+CHUNK_SIZE = 65536
+POOL_THRESHOLD = 262144
+
+
+def decode_secrets(secrets):
+    return [base64.b32decode(secret, casefold=True) for secret in secrets]
+
+
+def counters_for(start_time, steps, interval=DEFAULT_INTERVAL):
+    first = int(start_time // interval)
+    return list(range(first, first + steps))
+
+
+def hmac_digests(keys, counters, digest=DEFAULT_ALGORITHM):
+    messages = [struct.pack(">Q", counter) for counter in counters]
+    return b"".join(hmac.digest(key, message, digest) for key in keys for message in messages)
+
+
+def truncate(digests, digest_size, digits):
+    if np is None:
+        codes = []
+        for start in range(0, len(digests), digest_size):
+            offset = start + (digests[start + digest_size - 1] & 0x0F)
+            codes.append((struct.unpack_from(">I", digests, offset)[0] & 0x7FFFFFFF) % 10 ** digits)
+        return codes
+
+    # dynamic truncation over the whole digest array at once
+    rows = np.frombuffer(digests, dtype=np.uint8).reshape(-1, digest_size)
+    offsets = (rows[:, -1] & 0x0F).astype(np.intp)
+    picked = rows[np.arange(len(rows))[:, None], offsets[:, None] + np.arange(4)].astype(np.uint64)
+    values = ((picked[:, 0] & 0x7F) << 24) | (picked[:, 1] << 16) | (picked[:, 2] << 8) | picked[:, 3]
+    return values % (10 ** digits)
+
+
+def compute_block(keys, counters, digits=DEFAULT_DIGITS, digest=DEFAULT_ALGORITHM):
+    digest_size = hashlib.new(digest).digest_size
+    codes = truncate(hmac_digests(keys, counters, digest), digest_size, digits)
+    if np is not None:
+        return codes.reshape(len(keys), len(counters))
+    width = len(counters)
+    return [codes[row * width:(row + 1) * width] for row in range(len(keys))]
+
+
+def iter_code_blocks(keys, counters, digits=DEFAULT_DIGITS, digest=DEFAULT_ALGORITHM, workers=None):
+    # yields (index of the block's first key, block of len(block) x len(counters) codes) in key order
+    rows = max(1, CHUNK_SIZE // max(1, len(counters)))
+    starts = range(0, len(keys), rows)
+    if workers == 1 or len(keys) * len(counters) < POOL_THRESHOLD:
+        for start in starts:
+            yield start, compute_block(keys[start:start + rows], counters, digits, digest)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = (keys[start:start + rows] for start in starts)
+        blocks = pool.map(compute_block, chunks, repeat(counters), repeat(digits), repeat(digest))
+        for start, block in zip(starts, blocks):
+            yield start, block
+
+
+def generate_codes(secrets, counters, digits=DEFAULT_DIGITS, digest=DEFAULT_ALGORITHM, workers=None):
+    # M secrets x K counters -> M x K integer codes, zero-pad to `digits` for display
+    keys = decode_secrets(secrets)
+    blocks = [block for _, block in iter_code_blocks(keys, counters, digits, digest, workers)]
+    if np is not None:
+        if not blocks:
+            return np.empty((0, len(counters)), dtype=np.uint64)
+        return np.vstack(blocks)
+    return [row for block in blocks for row in block]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="aidex batch", description="Stream TOTP codes for every entry as JSON lines.")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config file to read (default: %(default)s)")
+    parser.add_argument("--start", type=float, default=None, help="unix time of the first step (default: now)")
+    parser.add_argument("--steps", type=int, default=1, help="number of consecutive time steps per entry")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for large inputs")
+    args = parser.parse_args(argv)
+
+    start = time.time() if args.start is None else args.start
+    out = sys.stdout
+
+    config_manager = TOTPConfig(args.config)
+    try:
+        unlock_from_terminal(config_manager)
+    except VaultError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    # entries sharing interval, digits and algorithm share code blocks, HOTP entries each count from their own counter
+    groups = {}
+    for config in config_manager.configs:
+        try:
+            key = base64.b32decode(config_manager.secret(config), casefold=True)
+        except (binascii.Error, VaultError):
+            out.write(json.dumps({"name": config.name, "error": "invalid secret"}) + "\n")
+            continue
+        if config.algorithm not in ALGORITHMS:
+            out.write(json.dumps({"name": config.name, "error": f"unsupported algorithm {config.algorithm!r}"}) + "\n")
+            continue
+        if config.counter is not None:
+            group = groups.setdefault((config.id, None, config.digits, config.algorithm), ([], []))
+        else:
+            group = groups.setdefault((None, config.interval, config.digits, config.algorithm), ([], []))
+        group[0].append(config)
+        group[1].append(key)
+
+    for (_, interval, digits, algorithm), (configs, keys) in groups.items():
+        if interval is None:
+            group_counters = list(range(configs[0].counter, configs[0].counter + args.steps))
+        else:
+            group_counters = counters_for(start, args.steps, interval)
+        for first, block in iter_code_blocks(keys, group_counters, digits, algorithm, args.workers):
+            lines = []
+            for config, row in zip(configs[first:], block):
+                for counter, value in zip(group_counters, row):
+                    line = {"name": config.name, "counter": counter}
+                    if interval is not None:
+                        line["time"] = counter * interval
+                    line["code"] = str(int(value)).zfill(digits)
+                    lines.append(json.dumps(line))
+            out.write("\n".join(lines) + "\n")
+    out.flush()
+    return 0
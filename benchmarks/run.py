@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from pathlib import Path
+
+# headless by default, must be set before Qt is imported
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt, QMimeData
+from PyQt5.QtGui import QDropEvent
+
+from config import TOTPConfig
+from gui import MainApp
+
+
+BASELINE_FILE = str(Path(__file__).resolve().parent / "baseline.json")
+DEFAULT_SIZES = (10, 1000, 10000)
+
+
+class FakeClock:
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class BenchDropEvent(QDropEvent):
+    # a synthetic drop has no drag source, dropEvent only accepts drops from the table itself
+    def __init__(self, pos, source):
+        self.mime = QMimeData()
+        super().__init__(pos, Qt.MoveAction, self.mime, Qt.LeftButton, Qt.NoModifier)
+        self.drag_source = source
+
+    def source(self):
+        return self.drag_source
+
+
+def make_configs(count):
+    configs = []
+    for i in range(count):
+        secret = base64.b32encode(hashlib.sha1(str(i).encode()).digest()[:10]).decode()
+        configs.append({"name": f"account-{i:05d}", "secret": secret, "prefix": "", "suffix": ""})
+    return configs
+
+
+def measure(run, repeat, setup=None):
+    # timed runs first, then one traced run for peak memory since tracemalloc skews timings
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"median_ms": statistics.median(times) * 1000, "min_ms": min(times) * 1000, "peak_kib": peak / 1024}
+
+
+def bench_size(app, size, repeat, workdir):
+    path = os.path.join(workdir, f"totp_config_{size}.json")
+    with open(path, "w") as f:
+        json.dump(make_configs(size), f, indent=4)
+
+    clock = FakeClock()
+    config_manager = TOTPConfig(path)
+    window = MainApp(config_manager, clock)
+    window.load_totp_configs()
+    window.show()
+    app.processEvents()
+
+    view = window.table_view
+    model = window.table_model
+    results = {}
+
+    def refresh():
+        clock.advance(30)
+        window.refresh_totp_codes()
+        app.processEvents()
+    results["refresh_totp_codes"] = measure(refresh, repeat)
+
+    def prepare_next_window():
+        # what the look-ahead worker does a few seconds before the boundary
+        window.engine.prepare(clock() + 30)
+    results["refresh_totp_codes (prepared)"] = measure(refresh, repeat, prepare_next_window)
+
+    def load():
+        window.load_totp_configs()
+        app.processEvents()
+    results["load_totp_configs"] = measure(load, repeat)
+
+    def prepare_drop():
+        target = model.index(min(size - 1, 5), 0)
+        view.scrollTo(target)
+        view.selectRow(0)
+        prepare_drop.event = BenchDropEvent(view.visualRect(target).center(), view)
+
+    def drop():
+        view.dropEvent(prepare_drop.event)
+        config_manager.flush()
+    results["dropEvent"] = measure(drop, repeat, prepare_drop)
+
+    def save():
+        config_manager.save_config()
+        config_manager.flush()
+    results["save_config"] = measure(save, repeat)
+    results["load_config"] = measure(config_manager.load_config, repeat)
+
+    results["perform_copy"] = measure(lambda: window.perform_copy(0), repeat)
+
+    def hide():
+        window.hide_action()
+        app.processEvents()
+
+    def show():
+        # tray click to painted popup, the paint happens in processEvents
+        window.show_action()
+        app.processEvents()
+    window.prewarm()
+    results["show_action"] = measure(show, repeat, hide)
+
+    window.hide()
+    config_manager.close()
+    window.deleteLater()
+    app.processEvents()
+    return results
+
+
+def compare(results, baseline):
+    lines = []
+    for key, result in results.items():
+        if "skipped" in result:
+            lines.append(f"{key:<42}{'skipped':>12}  {result['skipped']}")
+            continue
+        line = f"{key:<42}{result['median_ms']:10.3f} ms{result['peak_kib']:12.1f} KiB"
+        base = baseline.get(key)
+        if base and "median_ms" in base and base["median_ms"] > 0:
+            ratio = result["median_ms"] / base["median_ms"]
+            line += f"{ratio:9.2f}x baseline"
+        lines.append(line)
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the refresh, load, reorder, save and copy paths.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma separated entry counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(size) for size in args.sizes.split(",")):
+            for name, result in bench_size(app, size, args.repeat, workdir).items():
+                results[f"{name}@{size}"] = result
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print("\n".join(compare(results, baseline)))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import asyncio
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from engine import CompiledTOTP, DEFAULT_INTERVAL, DEFAULT_DIGITS, DEFAULT_ALGORITHM
+from verify import shard_for, shard_path, start_shards
+
+
+async def client(path, requests, pipeline, bulk, latencies, results):
+    reader, writer = await asyncio.open_unix_connection(path, limit=1 << 20)
+    for start in range(0, len(requests), pipeline):
+        batch = requests[start:start + pipeline]
+        began = time.perf_counter()
+        if bulk:
+            writer.write(json.dumps({"verify": batch}).encode() + b"\n")
+            answers = json.loads(await reader.readline())["results"]
+        else:
+            writer.write(b"".join(json.dumps({"id": entry_id, "code": code}).encode() + b"\n" for entry_id, code in batch))
+            answers = [json.loads(await reader.readline())["result"] for _ in batch]
+        latencies.append((time.perf_counter() - began) * 1000)
+        for answer in answers:
+            results[answer] = results.get(answer, 0) + 1
+    writer.close()
+
+
+def make_requests(entries, count, valid_share):
+    # valid codes for the current step, so the first use is "ok" and repeats are "replayed"
+    now = time.time()
+    codes = {entry_id: CompiledTOTP(secret).at(now) for entry_id, secret in entries.items()}
+    ids = list(entries)
+    requests = []
+    for _ in range(count):
+        entry_id = random.choice(ids)
+        code = codes[entry_id] if random.random() < valid_share else f"{random.randrange(10 ** 6):06d}"
+        requests.append((entry_id, code))
+    return requests
+
+
+async def drive(base, shards, requests, connections, pipeline, bulk):
+    per_shard = [[] for _ in range(shards)]
+    for entry_id, code in requests:
+        per_shard[shard_for(entry_id, shards)].append([entry_id, code])
+    latencies, results, tasks = [], {}, []
+    for shard, shard_requests in enumerate(per_shard):
+        for n in range(connections):
+            tasks.append(client(shard_path(base, shard), shard_requests[n::connections], pipeline, bulk, latencies, results))
+    began = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - began, latencies, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the verify service with pipelined clients.")
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--connections", type=int, default=4, help="client connections per shard")
+    parser.add_argument("--pipeline", type=int, default=64, help="requests in flight per connection")
+    parser.add_argument("--bulk", action="store_true", help="send each pipeline as one bulk verify request")
+    parser.add_argument("--valid-share", type=float, default=0.9)
+    args = parser.parse_args(argv)
+
+    entries = {f"{i:032x}": base64.b32encode(hashlib.sha1(str(i).encode()).digest()[:10]).decode() for i in range(args.entries)}
+    keys = {entry_id: CompiledTOTP(secret).key for entry_id, secret in entries.items()}
+    requests = make_requests(entries, args.requests, args.valid_share)
+
+    base = os.path.join(tempfile.mkdtemp(), "verify.sock")
+    processes = start_shards(base, {(DEFAULT_INTERVAL, DEFAULT_DIGITS, DEFAULT_ALGORITHM): keys}, args.shards, 1)
+    try:
+        deadline = time.monotonic() + 30
+        while not all(os.path.exists(shard_path(base, shard)) for shard in range(args.shards)):
+            if time.monotonic() > deadline:
+                raise SystemExit("shards did not come up")
+            time.sleep(0.05)
+        elapsed, latencies, results = asyncio.run(
+            drive(base, args.shards, requests, args.connections, args.pipeline, args.bulk))
+    finally:
+        for process in processes:
+            process.terminate()
+
+    latencies.sort()
+    print(f"{args.requests} verifications in {elapsed:.2f} s, {args.requests / elapsed:,.0f}/s "
+          f"over {args.shards} shards x {args.connections} connections")
+    print(f"per pipeline of {args.pipeline}: p50 {statistics.median(latencies):.2f} ms, "
+          f"p95 {latencies[len(latencies) * 95 // 100]:.2f} ms")
+    print("results " + ", ".join(f"{name} {count}" for name, count in sorted(results.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QGuiApplication
+import stats
+
+
+# AIDEX_CLIPBOARD=pyperclip skips QClipboard, e.g. for a Wayland session where only wl-copy works
+FORCE_PYPERCLIP = os.environ.get("AIDEX_CLIPBOARD") == "pyperclip"
+
+
+class ClipboardWorker(QObject):
+    # (text, error), error is empty on success, always delivered on the GUI thread
+    done = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.clipboard = QGuiApplication.clipboard()
+        self.native = not FORCE_PYPERCLIP
+        # pyperclip starts xclip/xsel/pbcopy per call, a single thread keeps that off the GUI thread and in order
+        self.executor = None
+
+    def copy(self, text):
+        started = time.perf_counter()
+        if self.native:
+            # Qt owns the selection in-process, reading it back tells whether the platform took it
+            self.clipboard.setText(text)
+            if self.clipboard.text() == text:
+                self.finish(text, "", started)
+                return
+            self.native = False
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aidex-clipboard")
+        self.executor.submit(self.copy_with_pyperclip, text, started)
+
+    def copy_with_pyperclip(self, text, started):
+        try:
+            import pyperclip
+            pyperclip.copy(text)
+            error = ""
+        except Exception as e:
+            error = str(e).splitlines()[0] if str(e) else type(e).__name__
+        self.finish(text, error, started)
+
+    def finish(self, text, error, started):
+        if stats.enabled:
+            stats.record("clipboard_ms", (time.perf_counter() - started) * 1000)
+        self.done.emit(text, error)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
@@ -0,0 +1,225 @@
+import uuid
+from pathlib import Path
+from entry import OTP_PARAMS, Entry
+from storage import JournalStore
+from vault import VAULT_SUFFIX, Vault, VaultError, VaultLocked
+
+
+# document path
+CONFIG_FILE = str(Path.home() / "Documents" / "totp_config.json")
+
+
+def correct_secret_padding(secret):
+    secret = secret.strip().replace(' ', '').upper()
+    missing_padding = len(secret) % 8
+    if missing_padding:
+        secret += '=' * (8 - missing_padding)
+    return secret
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+class TOTPConfig:
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self.store = JournalStore(path)
+        self.vault = Vault(path + VAULT_SUFFIX)
+        # plaintext of sealed secrets decrypted so far, by id, dropped again when the vault locks
+        self.secrets = {}
+        self.ids_unsaved = False
+        # local ops the last reload could not replay onto the snapshot someone else wrote
+        self.dropped_edits = 0
+        # Entry records in display order, plus the same records by id
+        self.configs = self.load_config()
+        self.by_id = {config.id: config for config in self.configs}
+
+    def load_config(self):
+        # snapshot plus whatever the journal recorded after it
+        configs = self.store.load()
+        self.assign_ids(configs)
+        return configs
+
+    def assign_ids(self, configs, known=()):
+        # entries written by other tools may lack ids, they get back the id of a `known` entry
+        # with the same secret, or failing that the same name, so a rename stays an update.
+        # A hand-copied entry repeats its original's id, the copy counts as having none
+        by_secret = {config.secret or config.sealed: config.id for config in known}
+        by_name = {config.name: config.id for config in known}
+        taken = {config.id for config in configs if config.id}
+        seen = set()
+        for config in configs:
+            if config.id and config.id not in seen:
+                seen.add(config.id)
+                continue
+            for entry_id in (by_secret.get(config.secret or config.sealed), by_name.get(config.name)):
+                if entry_id and entry_id not in taken:
+                    break
+            else:
+                entry_id = new_id()
+            if config.id and config.sealed and ":" not in config.sealed:
+                # the copy's secret stays sealed under the id it was copied with
+                config.sealed = f"{config.id}:{config.sealed}"
+            # still private to the loader at this point, so setting it in place is fine
+            config.id = entry_id
+            taken.add(entry_id)
+            seen.add(entry_id)
+            self.ids_unsaved = True
+
+    def reload_if_changed(self):
+        # -> the entries now on disk if someone else replaced the file, otherwise None
+        if not self.store.snapshot_changed():
+            return None
+        # our edits since the last compaction are replayed on top of the new snapshot, ids first so they find their entries
+        configs, replayed, self.dropped_edits = self.store.rebase(lambda configs: self.assign_ids(configs, self.configs))
+        if replayed and self.ids_unsaved:
+            # the replayed ops refer to ids the snapshot lacks, a replace after them makes the journal self-contained
+            self.ids_unsaved = False
+            self.store.append({"op": "replace", "entries": list(configs)})
+        self.vault.reload()
+        if not self.vault.active():
+            self.secrets.clear()
+        return configs
+
+    def adopt(self, configs):
+        # called by whoever applied the reloaded list, keeps the id lookup and decrypted secrets in step
+        self.configs = configs
+        self.by_id = {config.id: config for config in configs}
+        for entry_id in list(self.secrets):
+            if entry_id not in self.by_id:
+                del self.secrets[entry_id]
+
+    def save_pending_ids(self):
+        # ids given to older entries on load reach the file before the first op that refers to them,
+        # read-only users such as `aidex batch` never get here and leave the file alone
+        if self.ids_unsaved:
+            self.ids_unsaved = False
+            self.save_config()
+
+    def save_config(self):
+        # writes happen on the store's background thread, see storage.py
+        self.store.append({"op": "replace", "entries": list(self.configs)})
+
+    def needs_unlock(self):
+        return self.vault.exists and not self.vault.active()
+
+    def unlock(self, password):
+        self.vault.unlock(password)
+
+    def lock(self):
+        self.vault.lock()
+        self.secrets.clear()
+
+    def secret(self, config):
+        # sealed secrets are decrypted on first use, raises VaultLocked while the vault is locked
+        if config.sealed is None:
+            return config.secret
+        if not self.vault.active():
+            self.secrets.clear()
+            raise VaultLocked("the vault is locked")
+        secret = self.secrets.get(config.id)
+        if secret is None:
+            secret = self.secrets[config.id] = self.vault.open(config.id, config.sealed)
+        return secret
+
+    def cached_secret(self, config):
+        # the plaintext if it is already known, never decrypts
+        if config.sealed is not None:
+            return self.secrets.get(config.id)
+        return config.secret
+
+    def make_entry(self, entry_id, name, secret, prefix, suffix, **params):
+        # params: interval, digits, algorithm and counter where they differ from the defaults
+        if self.vault.exists:
+            self.secrets[entry_id] = secret
+            return Entry(entry_id, name, sealed=self.vault.seal(entry_id, secret), prefix=prefix, suffix=suffix, **params)
+        return Entry(entry_id, name, secret, prefix=prefix, suffix=suffix, **params)
+
+    def encrypt(self, password):
+        # seals every entry under a new vault, the plaintext is gone from disk once the store compacts
+        self.vault.create(password)
+        for index, config in enumerate(self.configs):
+            if config.sealed is None:
+                self.configs[index] = self.by_id[config.id] = config.replace(
+                    secret=None, sealed=self.vault.seal(config.id, config.secret))
+        self.ids_unsaved = False
+        self.save_config()
+
+    def decrypt(self):
+        for index, config in enumerate(self.configs):
+            if config.sealed is not None:
+                self.configs[index] = self.by_id[config.id] = config.replace(secret=self.secret(config), sealed=None)
+        self.ids_unsaved = False
+        self.save_config()
+        # the vault file goes only after the plaintext entries are on disk, until then it holds the only readable copy
+        if not self.flush():
+            raise VaultError(f"cannot write {self.path}: {self.store.error}, the vault was kept")
+        self.vault.remove()
+        self.secrets.clear()
+
+    def new_entries(self, entries):
+        # sealing raises VaultLocked once the vault idled out, before anything was changed
+        return [self.make_entry(new_id(), entry["name"], entry["secret"], entry.get("prefix", ""), entry.get("suffix", ""),
+                                **{key: entry[key] for key in OTP_PARAMS if key in entry})
+                for entry in entries]
+
+    def append_entries(self, configs):
+        # a bulk import is one journal op however many entries it has
+        self.save_pending_ids()
+        self.configs.extend(configs)
+        for config in configs:
+            self.by_id[config.id] = config
+        if len(configs) == 1:
+            self.store.append({"op": "add", "entry": configs[0]})
+        else:
+            self.store.append({"op": "extend", "entries": configs})
+
+    def add_config(self, name, secret, prefix="", suffix=""):
+        self.append_entries(self.new_entries([{"name": name, "secret": secret, "prefix": prefix, "suffix": suffix}]))
+        return True
+
+    def add_configs(self, entries):
+        self.append_entries(self.new_entries(entries))
+        return True
+
+    def update_config(self, index, name, secret, prefix="", suffix=""):
+        self.save_pending_ids()
+        old = self.configs[index]
+        # only this entry is sealed again, the others are left as they are
+        config = self.make_entry(old.id, name, secret, prefix, suffix, interval=old.interval, digits=old.digits,
+                                 algorithm=old.algorithm, counter=old.counter)
+        self.configs[index] = config
+        self.by_id[config.id] = config
+        self.store.append({"op": "update", "id": config.id, "entry": config})
+        return True
+
+    def delete_config(self, index):
+        self.save_pending_ids()
+        config = self.configs.pop(index)
+        del self.by_id[config.id]
+        self.secrets.pop(config.id, None)
+        self.store.append({"op": "delete", "id": config.id})
+
+    def move_config(self, index, destination):
+        # destination is the final index of the moved entry, persisted as a single small op
+        self.save_pending_ids()
+        config = self.configs.pop(index)
+        self.configs.insert(destination, config)
+        self.store.append({"op": "move", "id": config.id, "to": destination})
+
+    def advance_counter(self, index):
+        # an HOTP code was handed out, the next one takes its place; consecutive advances
+        # share one journal write, a crash before it can only repeat a code the server already refuses
+        self.save_pending_ids()
+        old = self.configs[index]
+        config = old.replace(counter=old.counter + 1)
+        self.configs[index] = self.by_id[config.id] = config
+        self.store.append({"op": "counter", "id": config.id, "counter": config.counter})
+        return config
+
+    def flush(self):
+        return self.store.flush()
+
+    def close(self):
+        self.store.close()
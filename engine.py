@@ -0,0 +1,111 @@
+import time
+import hmac
+import base64
+import struct
+import hashlib
+import stats
+
+
+DEFAULT_INTERVAL = 30
+DEFAULT_DIGITS = 6
+DEFAULT_ALGORITHM = "sha1"
+# otpauth algorithm names and their hash constructors
+ALGORITHMS = {"sha1": hashlib.sha1, "sha256": hashlib.sha256, "sha512": hashlib.sha512}
+
+
+class CompiledTOTP:
+    __slots__ = ("key", "interval", "digits", "_mac", "_counter", "_code", "_next")
+
+    def __init__(self, secret, interval=DEFAULT_INTERVAL, digits=DEFAULT_DIGITS, algorithm=DEFAULT_ALGORITHM):
+        # raises binascii.Error for an invalid secret, same as pyotp, and ValueError for an unknown algorithm
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"unsupported algorithm {algorithm!r}")
+        self.key = base64.b32decode(secret, casefold=True)
+        # None for HOTP entries, which are only ever asked for a counter's code
+        self.interval = interval
+        self.digits = digits
+        # keyed once here, every code after that only copies it
+        self._mac = hmac.new(self.key, digestmod=ALGORITHMS[algorithm])
+        self._counter = None
+        self._code = None
+        # (counter, code) precomputed by prepare(), one tuple so another thread swaps it atomically
+        self._next = (None, None)
+
+    def timecode(self, for_time):
+        return int(for_time // self.interval)
+
+    def generate(self, counter):
+        if stats.enabled:
+            stats.count("hmac")
+        mac = self._mac.copy()
+        mac.update(struct.pack(">Q", counter))
+        digest = mac.digest()
+        offset = digest[-1] & 0x0F
+        value = struct.unpack_from(">I", digest, offset)[0] & 0x7FFFFFFF
+        return str(value % 10 ** self.digits).zfill(self.digits)
+
+    def code(self, counter):
+        if counter != self._counter:
+            next_counter, next_code = self._next
+            self._code = next_code if counter == next_counter else self.generate(counter)
+            self._counter = counter
+        return self._code
+
+    def prepare(self, counter):
+        # safe to call from a worker thread, the next code() for this counter is then just a swap
+        if counter != self._counter and counter != self._next[0]:
+            self._next = (counter, self.generate(counter))
+
+    def peek(self, counter):
+        # the precomputed code if there is one, never computes
+        next_counter, next_code = self._next
+        return next_code if counter == next_counter else None
+
+    def at(self, for_time):
+        return self.code(self.timecode(for_time))
+
+    def time_remaining(self, for_time):
+        return int(self.interval - for_time % self.interval + 1)
+
+
+class TOTPEngine:
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.entries = {}
+
+    def compile(self, secret, interval=DEFAULT_INTERVAL, digits=DEFAULT_DIGITS, algorithm=DEFAULT_ALGORITHM):
+        key = (secret, interval, digits, algorithm)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = CompiledTOTP(secret, interval, digits, algorithm)
+            self.entries[key] = entry
+        return entry
+
+    def compile_config(self, config, secret):
+        # `secret` is the entry's plaintext, which sealed entries do not carry themselves
+        interval = None if config.counter is not None else config.interval
+        return self.compile(secret, interval, config.digits, config.algorithm)
+
+    def code(self, config, secret):
+        # the code to hand out now, the counter's for HOTP entries
+        entry = self.compile_config(config, secret)
+        if config.counter is not None:
+            return entry.code(config.counter)
+        return entry.at(self.clock())
+
+    def prepare(self, for_time, interval=None):
+        # look-ahead for every compiled entry (or those with `interval`), codes current at `for_time`
+        for entry in list(self.entries.values()):
+            if entry.interval is not None and (interval is None or entry.interval == interval):
+                entry.prepare(entry.timecode(for_time))
+
+    def forget(self, secret):
+        for key in [key for key in self.entries if key[0] == secret]:
+            del self.entries[key]
+
+    def retain(self, secrets):
+        # drop compiled entries for secrets that were edited or deleted
+        secrets = set(secrets)
+        for key in list(self.entries):
+            if key[0] not in secrets:
+                del self.entries[key]
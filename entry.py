@@ -0,0 +1,66 @@
+from engine import DEFAULT_INTERVAL, DEFAULT_DIGITS, DEFAULT_ALGORITHM
+
+
+# the fields that decide how codes are made, imports and the config file may set any of them
+OTP_PARAMS = ("interval", "digits", "algorithm", "counter")
+
+
+class Entry:
+    # One config entry. Records are never changed after they are shared, an edit builds a new one,
+    # so the store's writer thread can keep the very same objects as its snapshot state.
+    __slots__ = ("id", "name", "secret", "sealed", "prefix", "suffix", "interval", "digits", "algorithm", "counter")
+
+    def __init__(self, id, name, secret=None, sealed=None, prefix="", suffix="", interval=DEFAULT_INTERVAL,
+                 digits=DEFAULT_DIGITS, algorithm=DEFAULT_ALGORITHM, counter=None):
+        self.id = id
+        self.name = name
+        # exactly one of secret and sealed is set, see vault.py
+        self.secret = secret
+        self.sealed = sealed
+        self.prefix = prefix
+        self.suffix = suffix
+        self.interval = interval
+        self.digits = digits
+        self.algorithm = algorithm
+        # the next HOTP counter, None for TOTP entries
+        self.counter = counter
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("id"), data["name"], data.get("secret"), data.get("sealed"), data.get("prefix", ""),
+                   data.get("suffix", ""), data.get("interval", DEFAULT_INTERVAL), data.get("digits", DEFAULT_DIGITS),
+                   data.get("algorithm", DEFAULT_ALGORITHM), data.get("counter"))
+
+    def to_dict(self):
+        # the JSON layout the config file has always had, defaults are left out
+        data = {"id": self.id, "name": self.name}
+        if self.sealed is not None:
+            data["sealed"] = self.sealed
+        else:
+            data["secret"] = self.secret
+        data["prefix"] = self.prefix
+        data["suffix"] = self.suffix
+        if self.interval != DEFAULT_INTERVAL:
+            data["interval"] = self.interval
+        if self.digits != DEFAULT_DIGITS:
+            data["digits"] = self.digits
+        if self.algorithm != DEFAULT_ALGORITHM:
+            data["algorithm"] = self.algorithm
+        if self.counter is not None:
+            data["counter"] = self.counter
+        return data
+
+    def replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return Entry(**values)
+
+    def __eq__(self, other):
+        if not isinstance(other, Entry):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Entry({self.id!r}, {self.name!r})"
@@ -0,0 +1,646 @@
+
+import gc
+import sys
+import time
+import base64
+import binascii
+import platform
+from PyQt5.QtWidgets import (
+    QApplication, QSystemTrayIcon, QDialog, QPushButton, QLineEdit, QVBoxLayout, QWidget, QHBoxLayout, QMessageBox,
+    QHeaderView, QAbstractItemView, QScrollArea, QFrame, QSpacerItem, QSizePolicy, QShortcut, QPlainTextEdit,
+    QInputDialog, QFileDialog, QComboBox
+)
+from PyQt5.QtCore import QTimer, QThreadPool, QPoint, Qt, pyqtSlot, QEvent
+from PyQt5.QtGui import QIcon, QCursor, QPainter, QBrush, QColor, QKeySequence, QFont
+from pathlib import Path
+from config import correct_secret_padding
+from manifest import VaultManifest
+from engine import TOTPEngine
+from ipc import handle, find_vault
+from ipc_server import IPCServer
+from importer import import_file
+from clipboard import ClipboardWorker
+from watcher import ConfigWatcher
+from theme import apply_theme
+from vault import IDLE_CHECK, VaultError, VaultLocked
+import startup
+import stats
+from scheduler import RefreshScheduler, LookAhead
+from table import TOTPTableModel, ActionDelegate, DraggableTableView, NAME_COLUMN, TIME_COLUMN, ACTION_COLUMN
+
+
+if hasattr(sys, '_MEIPASS'):
+    base_path = Path(sys._MEIPASS)
+else:
+    base_path = Path(__file__).resolve().parent
+
+icon_path = str(base_path / 'icon.icns')
+
+
+class MainApp(QDialog):
+    def __init__(self, config_manager=None, clock=time.time, manifest=None):
+        super().__init__()
+        # a config_manager passed in is the only vault, otherwise the manifest names them and each loads on first use
+        if config_manager is None:
+            self.manifest = manifest if manifest is not None else VaultManifest()
+            self.vault_name = self.manifest.default
+            config_manager = self.manifest.open(self.vault_name)
+        else:
+            self.manifest = None
+            self.vault_name = None
+        self.config_manager = config_manager
+        self.engine = TOTPEngine(clock)
+        self.initUI()
+        self.clipboard = ClipboardWorker(self)
+        self.clipboard.done.connect(self.copy_done)
+        self.ipc_server = None
+        self.config_watcher = None
+        # perf_counter() of the last show until its first paint, only set while stats are on
+        self.show_started = None
+
+    def initUI(self):
+        # the tray icon comes first so it shows up before the rest of the window is built
+        self.icon = QIcon(icon_path)
+        self.tray_icon = QSystemTrayIcon(self)
+        self.tray_icon.setIcon(self.icon)
+
+        self.tray_icon.show()
+        self.tray_icon.activated.connect(self.tray_icon_clicked)
+        startup.mark("tray icon shown")
+
+        self.setWindowTitle("aidex")
+        self.setGeometry(300, 300, 450, 400)
+        self.setWindowFlags(Qt.Tool | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
+        self.setWindowOpacity(0.85)
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        
+        self.layout = QVBoxLayout()
+        self.setLayout(self.layout)
+    
+        self.button_layout = QHBoxLayout()
+
+        # only shown with more than one vault, the search field gives up the room it takes
+        vaults = self.manifest.names() if self.manifest is not None else []
+        self.vault_box = QComboBox(self)
+        self.vault_box.addItems(vaults)
+        self.vault_box.setFixedWidth(100)
+        self.vault_box.setFocusPolicy(Qt.NoFocus)
+        self.vault_box.activated.connect(lambda index: self.switch_vault(self.vault_box.itemText(index)))
+        self.vault_box.setVisible(len(vaults) > 1)
+        self.button_layout.addWidget(self.vault_box)
+
+        self.search_edit = QLineEdit(self)
+        self.search_edit.setPlaceholderText("Search")
+        self.search_edit.setFixedWidth(214 if len(vaults) > 1 else 320)
+        self.search_edit.setStyleSheet("color: white;")
+        self.search_edit.textChanged.connect(self.search_configs)
+        self.search_edit.returnPressed.connect(self.copy_top_match)
+        self.button_layout.addWidget(self.search_edit)
+
+        spacer = QSpacerItem(10, 0, QSizePolicy.Fixed, QSizePolicy.Minimum)
+        self.button_layout.addItem(spacer)
+
+        self.add_button = QPushButton("+", self)
+        self.add_button.clicked.connect(lambda: self.show_config_dialog("", "", "", "", is_new=True))
+        self.add_button.setFixedWidth(42)
+        self.add_button.setFocusPolicy(Qt.NoFocus)
+        self.add_button.setAutoDefault(False)
+        self.button_layout.addWidget(self.add_button)
+
+        spacer = QSpacerItem(7, 0, QSizePolicy.Fixed, QSizePolicy.Minimum)
+        self.button_layout.addItem(spacer)
+
+        self.quit_button = QPushButton("×", self)
+        self.quit_button.clicked.connect(lambda: quit())
+        self.quit_button.setFixedWidth(42)
+        self.quit_button.setFocusPolicy(Qt.NoFocus)
+        self.quit_button.setAutoDefault(False)
+        self.button_layout.addWidget(self.quit_button)
+
+        self.button_layout.addStretch()
+        self.layout.addLayout(self.button_layout, Qt.AlignRight)
+
+        self.table_model = TOTPTableModel(self.config_manager, self.engine, self)
+        self.table_view = DraggableTableView(self)
+        self.table_view.setModel(self.table_model)
+        self.table_view.setShowGrid(False)
+        self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table_view.horizontalHeader().setSectionResizeMode(TIME_COLUMN, QHeaderView.Interactive)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_view.verticalHeader().setDefaultSectionSize(40)
+        self.table_view.verticalHeader().setHidden(True)
+        self.table_view.setFrameStyle(QFrame.NoFrame)
+        self.table_view.setMouseTracking(True)
+
+        self.action_delegate = ActionDelegate(self.table_view)
+        self.action_delegate.clicked.connect(self.edit_config)
+        self.table_view.setItemDelegateForColumn(ACTION_COLUMN, self.action_delegate)
+        self.table_view.doubleClicked.connect(self.copy_to_clipboard)
+
+        self.scroll_area = QScrollArea(self)
+        self.scroll_area.setWidgetResizable(True)
+        self.scroll_area.setWidget(self.table_view)
+        self.layout.addWidget(self.scroll_area)
+
+        # only runs while the popup is visible, see show_action/hide_action
+        self.scheduler = RefreshScheduler(self.engine.clock, self)
+        self.scheduler.rollover.connect(self.table_model.refresh_codes)
+        self.scheduler.tick.connect(self.table_model.refresh_times)
+        self.scheduler.lookahead.connect(self.precompute_codes)
+        
+        # keys of an idle vault are wiped on time, not only when the popup next needs one
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setInterval(IDLE_CHECK * 1000)
+        self.idle_timer.timeout.connect(self.lock_idle_vaults)
+        self.idle_timer.start()
+
+        # vaults switched away from are closed once idle, see manifest.py
+        self.unload_timer = QTimer(self)
+        self.unload_timer.setInterval(60 * 1000)
+        self.unload_timer.timeout.connect(self.unload_idle_vaults)
+
+        # not shown anywhere in the UI, see stats.py
+        self.stats_shortcut = QShortcut(QKeySequence("Ctrl+Shift+S"), self)
+        self.stats_shortcut.activated.connect(self.show_stats)
+        self.stats_dialog = None
+        
+    def popup_position(self):
+        # below the tray icon on macOS, above it elsewhere, at the cursor if the platform hides the icon's geometry
+        icon_rect = self.tray_icon.geometry()
+        anchor = icon_rect.center() if icon_rect.isValid() else QCursor.pos()
+        screen = QApplication.screenAt(anchor) or QApplication.primaryScreen()
+        available = screen.availableGeometry()
+        size = self.size()
+
+        x = anchor.x() - size.width() // 2
+        if platform.system() == "Darwin":
+            y = (icon_rect.bottom() if icon_rect.isValid() else anchor.y()) + 5
+        else:
+            y = (icon_rect.top() if icon_rect.isValid() else anchor.y()) - size.height() - 5
+
+        # Cross-border judgment
+        if x < available.left():
+            x = available.left()
+        elif x + size.width() > available.right():
+            x = available.right() - size.width()
+        if y < available.top():
+            y = available.top()
+        elif y + size.height() > available.bottom():
+            y = available.bottom() - size.height()
+        return QPoint(x, y)
+
+    def prewarm(self):
+        # what the first show would otherwise pay for: style polish, layout and the native window
+        self.ensurePolished()
+        self.layout.activate()
+        self.winId()
+        self.move(self.popup_position())
+
+    @stats.timed("load_totp_configs_ms")
+    def load_totp_configs(self):
+        self.table_model.reload()
+        self.table_view.resizeColumnToContents(TIME_COLUMN)
+        self.scheduler.set_periods(self.table_model.periods())
+
+    @stats.timed("refresh_totp_codes_ms")
+    def refresh_totp_codes(self):
+        self.table_model.refresh_codes()
+
+    def apply_external_changes(self):
+        configs = self.config_manager.reload_if_changed()
+        if configs is None:
+            return
+        self.table_model.apply_changes(configs)
+        self.scheduler.set_periods(self.table_model.periods())
+        if self.config_manager.dropped_edits:
+            self.show_notification(f"{self.config_manager.dropped_edits} local edits no longer fit the changed config and were dropped.")
+
+    def switch_vault(self, name):
+        if name == self.vault_name:
+            return
+        self.search_edit.clear()
+        # the idle time of the vault left behind starts now
+        self.manifest.touch(self.vault_name)
+        config_manager = self.manifest.open(name)
+        self.vault_name = name
+        self.config_manager = config_manager
+        self.table_model.config_manager = config_manager
+        # keys compiled for the previous vault go, only the vault on screen has any in memory
+        self.engine.retain(())
+        if self.config_watcher is not None:
+            self.config_watcher.set_path(config_manager.path)
+        if config_manager.needs_unlock():
+            self.unlock_vault()
+        self.load_totp_configs()
+        self.unload_timer.start()
+
+    def unload_idle_vaults(self):
+        self.manifest.unload_idle(keep=self.vault_name)
+        if len(self.manifest.loaded) < 2:
+            self.unload_timer.stop()
+
+    def lock_idle_vaults(self):
+        config_managers = list(self.manifest.loaded.values()) if self.manifest is not None else [self.config_manager]
+        for config_manager in config_managers:
+            if config_manager.vault.idle_out():
+                # the derived key is gone, so go the decrypted secrets and the HMAC keys compiled from them
+                config_manager.lock()
+                if config_manager is self.config_manager:
+                    self.engine.retain(())
+                    self.table_model.refresh_codes()
+
+    def close_vaults(self):
+        if self.manifest is not None:
+            self.manifest.close()
+        else:
+            self.config_manager.close()
+
+    def precompute_codes(self, period, boundary):
+        QThreadPool.globalInstance().start(LookAhead(self.engine, period, boundary))
+
+    def search_configs(self, text):
+        self.table_model.search(text)
+
+    def copy_top_match(self):
+        if self.table_model.rowCount():
+            self.copy_to_clipboard(self.table_model.index(0, NAME_COLUMN))
+
+    def copy_to_clipboard(self, index):
+        if index.column() == ACTION_COLUMN:
+            return
+        self.perform_copy(index.row())
+
+    @stats.timed("copy_ms")
+    def perform_copy(self, row):
+        # the code for the current window is usually memoized from painting the row already
+        config = self.table_model.config_at(row)
+        try:
+            code = self.engine.code(config, self.config_manager.secret(config))
+        except VaultLocked:
+            self.show_notification("The vault is locked.")
+            return
+        except (ValueError, VaultError):
+            self.show_notification("The secret provided is not valid.")
+            return
+        self.clipboard.copy(f"{config.prefix}{code}{config.suffix}")
+        if config.counter is not None:
+            # an HOTP code is used once copied
+            self.table_model.advance_counter(row)
+        self.table_view.clearSelection()  # clear select
+
+    def copy_done(self, text, error):
+        if error:
+            self.show_notification(f"Copy failed: {error}")
+        else:
+            self.show_notification(f"Copied: {text}")
+
+    def show_stats(self):
+        if self.stats_dialog is None:
+            self.stats_dialog = StatsDialog(self)
+        self.stats_dialog.show()
+        self.stats_dialog.raise_()
+
+    def handle_request(self, message):
+        if message.get("cmd") == "show":
+            self.show_action()
+            return {"ok": True}
+        try:
+            config_manager = self.request_vault(message)
+        except KeyError as e:
+            return {"ok": False, "error": f"no vault named {e.args[0]!r}"}
+        if self.manifest is not None and len(self.manifest.loaded) > 1:
+            # vaults opened for this request, a lookup by name may have parsed several, close once idle
+            self.unload_timer.start()
+        if message.get("cmd") == "import":
+            return self.import_file(message.get("path", ""), message.get("workers"), config_manager)
+        if config_manager is not self.config_manager:
+            # keys compiled for a vault off screen are not kept around
+            return handle(message, config_manager, TOTPEngine(self.engine.clock))
+        result = handle(message, self.config_manager, self.engine)
+        if message.get("cmd") == "code":
+            # an HOTP code handed out moved its counter
+            self.table_model.refresh_codes()
+        return result
+
+    def request_vault(self, message):
+        # -> the config manager a request is for, a code asked for by name alone comes from the first vault that has it
+        name = message.get("vault")
+        if self.manifest is None:
+            if name is not None:
+                raise KeyError(name)
+            return self.config_manager
+        if name is None and message.get("cmd") == "code":
+            name = find_vault(self.manifest, message.get("name", ""))
+        if name is None or name == self.vault_name:
+            return self.config_manager
+        if name not in self.manifest.vaults:
+            raise KeyError(name)
+        return self.manifest.open(name)
+
+    def show_notification(self, message):
+        self.tray_icon.showMessage("aidex", message, self.icon, 2000)
+
+    def unlock_vault(self, config_manager=None):
+        # one password prompt per unlock, the derived key stays cached until the vault idles out
+        config_manager = config_manager or self.config_manager
+        while config_manager.needs_unlock():
+            password, ok = QInputDialog.getText(self, "Unlock", "Vault password:", QLineEdit.Password)
+            if not ok:
+                return False
+            try:
+                config_manager.unlock(password)
+            except VaultError as e:
+                self.show_notification(str(e))
+        return True
+
+    def import_file(self, path, workers=None, config_manager=None):
+        config_manager = config_manager or self.config_manager
+        if not self.unlock_vault(config_manager):
+            return {"ok": False, "error": "vault is locked"}
+        on_screen = config_manager is self.config_manager
+        result = import_file(config_manager, path, self.table_model.add_configs if on_screen else None, workers)
+        if result["ok"]:
+            if on_screen:
+                self.scheduler.set_periods(self.table_model.periods())
+            self.show_notification(f"Imported {result['imported']}, skipped {result['duplicates']} duplicates, {len(result['errors'])} errors")
+        else:
+            self.show_notification(result["error"])
+        return result
+
+    def dialog_open(self):
+        return any(isinstance(widget, (ConfigDialog, QInputDialog)) and widget.isVisible() for widget in self.findChildren(QWidget))
+
+    def show_config_dialog(self, name="", secret="", prefix="", suffix="", entry_id=None, is_new=False):
+        # new and edited secrets are sealed right away, which needs the key
+        if not self.unlock_vault():
+            return
+        config_dialog = ConfigDialog(self, name, secret, prefix, suffix, entry_id, is_new)
+        if config_dialog.exec_() == QDialog.Accepted:
+            name, secret, prefix, suffix, is_delete = config_dialog.get_data()
+            secret = correct_secret_padding(secret)
+            while True:
+                # the watcher or an import may have moved rows while the dialog was open, find the entry again
+                row = None
+                if not is_new:
+                    if entry_id not in self.config_manager.by_id:
+                        self.show_notification("The entry was removed in the meantime, nothing was saved.")
+                        return
+                    row = self.table_model.row_of(entry_id)
+                    if row is None:
+                        # hidden by the search, which the edit then ends
+                        self.search_edit.clear()
+                        if self.table_model.visible is not None:
+                            self.table_model.search("")
+                        row = self.table_model.row_of(entry_id)
+                try:
+                    if is_delete:
+                        self.table_model.delete_config(row)
+                    elif is_new:
+                        self.table_model.add_config(name, secret, prefix, suffix)
+                    else:
+                        self.table_model.update_config(row, name, secret, prefix, suffix)
+                    break
+                except VaultLocked:
+                    # the dialog stayed open past the idle timeout, sealing needs the key again
+                    if not self.unlock_vault():
+                        self.show_notification("The vault is locked, nothing was saved.")
+                        return
+            self.scheduler.set_periods(self.table_model.periods())
+    
+    def edit_config(self, row):
+        if not self.unlock_vault():
+            return
+        config = self.table_model.config_at(row)
+        try:
+            secret = self.config_manager.secret(config)
+        except VaultError as e:
+            self.show_notification(str(e))
+            return
+        self.show_config_dialog(config.name, secret, config.prefix, config.suffix, config.id)
+
+    def show_action(self):
+        if self.config_manager.needs_unlock():
+            # locked or idled out, compiled keys go with the derived one
+            self.config_manager.lock()
+            self.engine.retain(())
+            self.unlock_vault()
+        if stats.enabled:
+            self.show_started = time.perf_counter()
+        # catch up on whatever rolled over while hidden, then resume the scheduler
+        self.refresh_totp_codes()
+        self.scheduler.start()
+        # placed before it maps, so the first frame is already where it belongs
+        position = self.popup_position()
+        if position != self.pos():
+            self.move(position)
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        self.search_edit.setFocus()
+        
+    def hide_action(self):
+        self.scheduler.stop()
+        self.hide()
+        self.search_edit.clear()
+        self.table_view.clearSelection()
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setBrush(QBrush(QColor(48, 54, 59)))
+        painter.setPen(Qt.NoPen)
+        rect = self.rect()
+        rect.setHeight(rect.height() - 1)
+        rect.setWidth(rect.width() - 1)
+        painter.drawRoundedRect(rect, 20, 20)
+        if self.show_started is not None:
+            stats.record("popup_ms", (time.perf_counter() - self.show_started) * 1000)
+            self.show_started = None
+
+    def tray_icon_clicked(self, reason):
+        if reason == QSystemTrayIcon.Trigger or reason == QSystemTrayIcon.DoubleClick:
+            if self.dialog_open():
+                return
+            if self.isHidden():
+                self.show_action()
+            else:
+                self.hide_action()
+ 
+    def event(self, event):
+        if event.type() == QEvent.WindowDeactivate:
+            if not self.tray_icon.geometry().contains(QCursor.pos()) and not self.dialog_open():
+                self.hide_action()
+        return super().event(event)
+
+
+class StatsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("aidex stats")
+        self.setGeometry(400, 400, 560, 360)
+        self.setWindowIcon(QIcon(icon_path))
+
+        self.layout = QVBoxLayout(self)
+        self.text = QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        self.text.setFont(QFont("monospace"))
+        self.layout.addWidget(self.text)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        if not stats.enabled:
+            self.text.setPlainText("Stats are off, start aidex with AIDEX_STATS=1 to collect them.")
+            return
+        self.text.setPlainText(stats.format_snapshot(stats.snapshot()))
+
+    def showEvent(self, event):
+        self.refresh()
+        self.timer.start(1000)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+
+class ConfigDialog(QDialog):
+    def __init__(self, parent=None, name="", secret="", prefix="", suffix="", entry_id=None, is_new=False):
+        super().__init__(parent)
+        self.parent = parent
+        self.is_new = is_new
+        self.entry_id = entry_id
+        self.is_delete = False
+        self.setWindowTitle("TOTP Config")
+        self.setGeometry(400, 400, 300, 200)
+        self.setWindowIcon(QIcon(icon_path))
+        self.setWindowOpacity(0.9)
+
+        self.layout = QVBoxLayout(self)
+
+        self.name_edit = QLineEdit(self)
+        self.name_edit.setPlaceholderText("Name")
+        self.name_edit.setText(name)
+        self.name_edit.setStyleSheet("color: white;")
+        self.layout.addWidget(self.name_edit)
+
+        self.secret_edit = QLineEdit(self)
+        self.secret_edit.setPlaceholderText("Secret")
+        self.secret_edit.setText(secret)
+        self.secret_edit.setStyleSheet("color: white;")
+        self.layout.addWidget(self.secret_edit)
+
+        self.prefix_edit = QLineEdit(self)
+        self.prefix_edit.setPlaceholderText("Password Prefix")
+        self.prefix_edit.setText(prefix)
+        self.prefix_edit.setStyleSheet("color: white;")
+        self.layout.addWidget(self.prefix_edit)
+
+        self.suffix_edit = QLineEdit(self)
+        self.suffix_edit.setPlaceholderText("Password Suffix")
+        self.suffix_edit.setText(suffix)
+        self.suffix_edit.setStyleSheet("color: white;")
+        self.layout.addWidget(self.suffix_edit)
+
+        self.button_layout = QHBoxLayout()
+
+        self.save_button = QPushButton("Save", self)
+        self.save_button.clicked.connect(self.save)
+        self.button_layout.addWidget(self.save_button)
+
+        if is_new:
+            self.import_button = QPushButton("Import…", self)
+            self.import_button.clicked.connect(self.import_file)
+            self.button_layout.addWidget(self.import_button)
+        else:
+            self.delete_button = QPushButton("Delete", self)
+            self.delete_button.clicked.connect(self.delete)
+            self.button_layout.addWidget(self.delete_button)
+
+        self.layout.addLayout(self.button_layout)
+        
+    def get_data(self):
+        return (self.name_edit.text(), self.secret_edit.text(), self.prefix_edit.text(), self.suffix_edit.text(), self.is_delete)
+
+    def save(self):
+        secret = correct_secret_padding(self.secret_edit.text())
+        if not self.validate_secret(secret):
+            return
+        self.accept()
+        
+    def validate_secret(self, secret):
+        secret = secret.strip().replace(' ', '').upper()
+        if not secret:
+            self.parent.show_notification("The secret cannot be empty.")
+            return False
+        try:
+            # decoded only, compiling would cache a key for a secret that may never be saved
+            base64.b32decode(secret, casefold=True)
+            return True
+        except binascii.Error:
+            self.parent.show_notification("The secret provided is not valid.")
+            return False
+
+    @pyqtSlot()
+    def import_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import", "", "otpauth lists and JSON (*.txt *.json *.jsonl);;All files (*)")
+        if path:
+            self.reject()
+            self.parent.import_file(path)
+
+    @pyqtSlot()
+    def delete(self):
+        reply = QMessageBox.question(self, "Delete", "Are you sure you want to delete this config?",
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.is_delete = True
+            self.accept()
+
+
+
+def finish_startup(app, window):
+    # runs from the event loop, after the tray icon has been painted
+    startup.mark("event loop running")
+    window.ipc_server = IPCServer(window.handle_request, window)
+    window.ipc_server.listen()
+    window.config_watcher = ConfigWatcher(window.config_manager.path, window)
+    window.config_watcher.changed.connect(window.apply_external_changes)
+    window.config_watcher.start()
+    apply_theme(app)
+    startup.mark("theme applied")
+    window.load_totp_configs()
+    startup.mark("table populated")
+    window.prewarm()
+    startup.mark("popup prewarmed")
+    # the entries and Qt wrappers live as long as the app, keep the cyclic collector from rescanning them
+    gc.freeze()
+    startup.report()
+    # the search index is built while idle rather than on the first keystroke
+    QTimer.singleShot(0, window.table_model.build_search_index)
+
+
+def main():
+    startup.mark("gui imported")
+    stats.install_exit_dump()
+    app = QApplication(sys.argv)
+    app.setApplicationName("aidex")
+    app.setApplicationVersion("1.0")
+
+    if sys.platform == "darwin":
+        from AppKit import NSApp
+        NSApp.setActivationPolicy_(1)
+    elif sys.platform == "win32":
+        from ctypes import windll
+        windll.shell32.SetCurrentProcessExplicitAppUserModelID('aidex')
+    startup.mark("application created")
+
+    window = MainApp()
+    app.aboutToQuit.connect(window.close_vaults)
+    app.aboutToQuit.connect(window.clipboard.shutdown)
+    window.hide()
+    window.tray_icon.show()
+    startup.mark("window built")
+    QTimer.singleShot(0, lambda: finish_startup(app, window))
+    sys.exit(app.exec_())
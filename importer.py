@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import base64
+import binascii
+import argparse
+from itertools import islice
+from collections import deque
+from urllib.parse import urlsplit, parse_qs, unquote
+from concurrent.futures import ProcessPoolExecutor
+
+from config import correct_secret_padding
+from engine import ALGORITHMS
+from vault import VaultError
+
+
+# records validated per task, how many are done inline before a process pool pays off,
+# and how many tasks may be queued ahead of the one being collected
+CHUNK_SIZE = 2048
+POOL_THRESHOLD = 16384
+IN_FLIGHT = 8
+READ_SIZE = 65536
+
+
+def parse_otpauth(uri):
+    parts = urlsplit(uri)
+    if parts.scheme != "otpauth":
+        raise ValueError("not an otpauth URI")
+    kind = parts.netloc.lower()
+    if kind not in ("totp", "hotp"):
+        raise ValueError(f"unsupported otpauth type {parts.netloc!r}")
+    params = parse_qs(parts.query)
+    label = unquote(parts.path.lstrip("/"))
+    issuer = params.get("issuer", [""])[0]
+    if ":" in label:
+        label_issuer, label = label.split(":", 1)
+        issuer = issuer or label_issuer
+    label = label.strip()
+    name = f"{issuer}:{label}" if issuer and label else issuer or label
+    entry = {"name": name, "secret": params.get("secret", [""])[0], "prefix": "", "suffix": ""}
+    for key, param in (("interval", "period"), ("digits", "digits"), ("algorithm", "algorithm")):
+        if param in params:
+            entry[key] = params[param][0]
+    if kind == "hotp":
+        if "counter" not in params:
+            raise ValueError("hotp URI without a counter")
+        entry["counter"] = params["counter"][0]
+    return entry
+
+
+def check_params(entry):
+    # interval, digits, algorithm and counter as the config file stores them, defaults are left out
+    for key in ("interval", "digits", "counter"):
+        if key in entry:
+            try:
+                entry[key] = int(entry[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} is not a number") from None
+    if entry.get("interval", 1) < 1:
+        raise ValueError("interval must be positive")
+    if not 6 <= entry.get("digits", 6) <= 10:
+        raise ValueError("digits must be between 6 and 10")
+    if entry.get("counter", 0) < 0:
+        raise ValueError("counter must not be negative")
+    if "algorithm" in entry:
+        entry["algorithm"] = str(entry["algorithm"]).lower()
+        if entry["algorithm"] not in ALGORITHMS:
+            raise ValueError(f"unsupported algorithm {entry['algorithm']!r}")
+
+
+def parse_record(item):
+    # an otpauth URI, or an object as exported by aidex or written by hand
+    if isinstance(item, str):
+        if item.startswith("{"):
+            return parse_record(json.loads(item))
+        return parse_otpauth(item)
+    if not isinstance(item, dict):
+        raise ValueError("expected an otpauth URI or an object")
+    uri = item.get("uri") or item.get("otpauth")
+    if uri:
+        return parse_otpauth(uri)
+    if "sealed" in item:
+        raise ValueError("sealed entries can only be read with their vault")
+    entry = {"name": str(item.get("name", "")), "secret": str(item.get("secret", "")),
+             "prefix": str(item.get("prefix", "")), "suffix": str(item.get("suffix", ""))}
+    for key in ("interval", "digits", "algorithm", "counter"):
+        if item.get(key) is not None:
+            entry[key] = item[key]
+    return entry
+
+
+def validate_chunk(items):
+    # runs in pool workers, so it only takes and returns plain data
+    results = []
+    for where, item in items:
+        try:
+            entry = parse_record(item)
+            if not entry["name"]:
+                raise ValueError("missing name")
+            entry["secret"] = correct_secret_padding(entry["secret"])
+            if entry["secret"].strip("="):
+                base64.b32decode(entry["secret"], casefold=True)
+            else:
+                raise ValueError("missing secret")
+            check_params(entry)
+            results.append((where, entry, None))
+        except (ValueError, binascii.Error) as e:
+            results.append((where, None, str(e) or type(e).__name__))
+    return results
+
+
+def iter_json_array(f):
+    # one element at a time, the whole document is never held in memory
+    decoder = json.JSONDecoder()
+    buffer = f.read(READ_SIZE).lstrip()[1:]
+    index = 0
+    while True:
+        buffer = buffer.lstrip().lstrip(",").lstrip()
+        if not buffer:
+            more = f.read(READ_SIZE)
+            if not more:
+                raise ValueError("unterminated JSON array")
+            buffer = more
+            continue
+        if buffer[0] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except ValueError:
+            more = f.read(READ_SIZE)
+            if not more:
+                raise
+            buffer += more
+            continue
+        index += 1
+        yield f"item {index}", item
+        buffer = buffer[end:]
+
+
+def iter_lines(f):
+    # otpauth URIs or JSON objects, one per line, blank lines and # comments skipped, parsed in validate_chunk
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        yield f"line {number}", line
+
+
+def iter_items(f):
+    head = f.read(READ_SIZE).lstrip()
+    f.seek(0)
+    if head.startswith("["):
+        return iter_json_array(f)
+    return iter_lines(f)
+
+
+def chunked(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_validated(items, workers=None):
+    # small inputs are validated inline, a pool only starts once the input is large
+    chunks = chunked(items, CHUNK_SIZE)
+    for chunk in islice(chunks, POOL_THRESHOLD // CHUNK_SIZE):
+        yield from validate_chunk(chunk)
+    if workers == 1:
+        for chunk in chunks:
+            yield from validate_chunk(chunk)
+        return
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in chunks:
+            pending.append(pool.submit(validate_chunk, chunk))
+            if len(pending) > IN_FLIGHT:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def read_entries(path, existing_secrets=(), workers=None):
+    # -> (new entries, [(where, error)], number of duplicates), duplicates by secret within the file and against existing_secrets
+    seen = set(existing_secrets)
+    entries, errors, duplicates = [], [], 0
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for where, entry, error in iter_validated(iter_items(f), workers):
+            if error is not None:
+                errors.append((where, error))
+            elif entry["secret"] in seen:
+                duplicates += 1
+            else:
+                seen.add(entry["secret"])
+                entries.append(entry)
+    return entries, errors, duplicates
+
+
+def import_file(config_manager, path, add=None, workers=None):
+    # the whole batch is committed through `add` at once, one journal op and one view update
+    try:
+        existing = {correct_secret_padding(config_manager.secret(config)) for config in config_manager.configs}
+        entries, errors, duplicates = read_entries(path, existing, workers)
+    except VaultError as e:
+        return {"ok": False, "error": str(e)}
+    except (OSError, ValueError) as e:
+        return {"ok": False, "error": f"cannot read {path}: {e}"}
+    if entries:
+        try:
+            (add or config_manager.add_configs)(entries)
+        except VaultError as e:
+            # the vault idled out while the file was read, nothing was added
+            return {"ok": False, "error": str(e)}
+    return {"ok": True, "imported": len(entries), "duplicates": duplicates,
+            "errors": [{"where": where, "error": error} for where, error in errors]}
+
+
+def main(argv=None):
+    from ipc import NOT_RUNNING, request
+    parser = argparse.ArgumentParser(prog="aidex import", description="Import otpauth:// URI lists or exported JSON files.")
+    parser.add_argument("path", help="file with one otpauth URI per line, a JSON array, or JSON lines")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for large inputs")
+    parser.add_argument("--vault", help="vault to import into (default: the open one, or the first when aidex is not running)")
+    parser.add_argument("--json", action="store_true", help="print the raw JSON response")
+    args = parser.parse_args(argv)
+
+    message = {"cmd": "import", "path": os.path.abspath(args.path), "workers": args.workers}
+    if args.vault is not None:
+        message["vault"] = args.vault
+    try:
+        # the running instance owns the config, let it apply the import
+        response = request(message, timeout=600)
+    except NOT_RUNNING:
+        from manifest import VaultManifest
+        from vault import unlock_from_terminal
+        manifest = VaultManifest()
+        vault = args.vault or manifest.default
+        if vault not in manifest.vaults:
+            response = {"ok": False, "error": f"no vault named {vault!r}"}
+        else:
+            try:
+                config_manager = manifest.open(vault)
+                unlock_from_terminal(config_manager)
+                response = import_file(config_manager, message["path"], workers=args.workers)
+            except VaultError as e:
+                response = {"ok": False, "error": str(e)}
+            finally:
+                manifest.close()
+    except (OSError, ValueError) as e:
+        # the instance may still be importing, a second local import would race it
+        response = {"ok": False, "error": f"aidex did not answer: {e}"}
+
+    if args.json:
+        print(json.dumps(response))
+    elif response.get("ok"):
+        for error in response["errors"]:
+            print(f"{error['where']}: {error['error']}", file=sys.stderr)
+        print(f"imported {response['imported']}, skipped {response['duplicates']} duplicates, {len(response['errors'])} errors")
+    else:
+        print(response.get("error", "failed"), file=sys.stderr)
+    return 0 if response.get("ok") else 1
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import socket
+import getpass
+import argparse
+import tempfile
+import stats
+from vault import VaultError, VaultLocked, unlock_from_terminal
+
+
+# what request() raises when no instance is listening, anything else means one was reached and failed
+NOT_RUNNING = (FileNotFoundError, ConnectionRefusedError)
+
+# requests and responses are single JSON objects, one per line
+def server_name():
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = str(os.getuid())
+    if sys.platform == "win32":
+        return f"aidex-{user}"
+    return os.path.join(tempfile.gettempdir(), f"aidex-{user}.sock")
+
+
+def request(message, timeout=2.0):
+    # raises one of NOT_RUNNING when no instance is listening, other OSErrors (a timeout) after it was reached
+    data = (json.dumps(message) + "\n").encode()
+    if sys.platform == "win32":
+        with open("\\\\.\\pipe\\" + server_name(), "r+b", buffering=0) as pipe:
+            pipe.write(data)
+            return json.loads(pipe.readline())
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(server_name())
+        sock.sendall(data)
+        response = b""
+        while not response.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+    return json.loads(response)
+
+
+def forward_show():
+    try:
+        return request({"cmd": "show"}).get("ok", False)
+    except (OSError, ValueError):
+        return False
+
+
+def find_config(configs, name):
+    for config in configs:
+        if config.name == name:
+            return config
+    folded = name.casefold()
+    for config in configs:
+        if config.name.casefold() == folded:
+            return config
+    return None
+
+
+def find_vault(manifest, name):
+    # -> the first vault with an entry called `name`, None when no vault has one.
+    # Vaults already loaded are searched first, the others are only parsed if none of them has it
+    names = manifest.names()
+    for vault in sorted(names, key=lambda vault: vault not in manifest.loaded):
+        if find_config(manifest.open(vault).configs, name) is not None:
+            return vault
+    return None
+
+
+def describe(engine, config_manager, config):
+    try:
+        totp = engine.compile_config(config, config_manager.secret(config))
+    except VaultLocked:
+        return {"id": config.id, "name": config.name, "error": "vault is locked"}
+    except (ValueError, VaultError):
+        return {"id": config.id, "name": config.name, "error": "invalid secret"}
+    if config.counter is not None:
+        return {"id": config.id, "name": config.name, "code": totp.code(config.counter), "counter": config.counter}
+    now = engine.clock()
+    return {"id": config.id, "name": config.name, "code": totp.at(now), "time_left": totp.time_remaining(now)}
+
+
+def handle(message, config_manager, engine):
+    command = message.get("cmd")
+    if command == "stats":
+        return {"ok": True, "stats": stats.snapshot()}
+    if command == "codes":
+        return {"ok": True, "codes": [describe(engine, config_manager, config) for config in config_manager.configs]}
+    if command == "code":
+        config = find_config(config_manager.configs, message.get("name", ""))
+        if config is None:
+            return {"ok": False, "error": f"no entry named {message.get('name')!r}"}
+        result = describe(engine, config_manager, config)
+        result["ok"] = "error" not in result
+        if result["ok"] and config.counter is not None:
+            # the HOTP code is handed out now, the next request gets the following one
+            config_manager.advance_counter(config_manager.configs.index(config))
+        return result
+    return {"ok": False, "error": f"unknown command {command!r}"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="aidex code", description="Print TOTP codes from the running aidex instance.")
+    parser.add_argument("name", nargs="?", help="entry name")
+    parser.add_argument("--all", action="store_true", help="print every entry as name and code")
+    parser.add_argument("--vault", help="vault to read (default: the first vault with the entry, for --all the open one)")
+    parser.add_argument("--json", action="store_true", help="print the raw JSON response")
+    args = parser.parse_args(argv)
+    if not args.all and not args.name:
+        parser.error("an entry name or --all is required")
+
+    message = {"cmd": "codes"} if args.all else {"cmd": "code", "name": args.name}
+    if args.vault is not None:
+        message["vault"] = args.vault
+    try:
+        response = request(message)
+    except NOT_RUNNING:
+        # no tray instance running, answer from the vault files directly
+        from engine import TOTPEngine
+        from manifest import VaultManifest
+        manifest = VaultManifest()
+        try:
+            vault = args.vault or (None if args.all else find_vault(manifest, args.name)) or manifest.default
+            if vault not in manifest.vaults:
+                response = {"ok": False, "error": f"no vault named {vault!r}"}
+            else:
+                config_manager = manifest.open(vault)
+                unlock_from_terminal(config_manager)
+                response = handle(message, config_manager, TOTPEngine())
+        except VaultError as e:
+            print(e, file=sys.stderr)
+            return 1
+        finally:
+            manifest.close()
+    except (OSError, ValueError) as e:
+        # the instance got the request, answering locally could hand out a second HOTP code
+        response = {"ok": False, "error": f"aidex did not answer: {e}"}
+
+    if args.json:
+        print(json.dumps(response))
+    elif args.all:
+        for item in response.get("codes", []):
+            print(f"{item['name']}\t{item.get('code', item.get('error'))}")
+    elif response.get("ok"):
+        print(response["code"])
+    else:
+        print(response.get("error", "failed"), file=sys.stderr)
+    return 0 if response.get("ok") else 1
+
+
+def stats_main(argv=None):
+    parser = argparse.ArgumentParser(prog="aidex stats", description="Dump live performance stats of the running aidex instance.")
+    parser.add_argument("--text", action="store_true", help="print a readable summary instead of JSON")
+    args = parser.parse_args(argv)
+    try:
+        response = request({"cmd": "stats"})
+    except (OSError, ValueError):
+        print("aidex is not running", file=sys.stderr)
+        return 1
+    data = response["stats"]
+    if not data["enabled"]:
+        print("stats are off, start aidex with AIDEX_STATS=1", file=sys.stderr)
+    print(stats.format_snapshot(data) if args.text else json.dumps(data, indent=4))
+    return 0
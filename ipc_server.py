@@ -0,0 +1,66 @@
+import json
+import traceback
+from PyQt5.QtCore import QObject
+from PyQt5.QtNetwork import QLocalServer
+from ipc import server_name
+
+
+# request fields and their types, anything else in a request is ignored
+FIELDS = {"cmd": str, "name": str, "path": str, "vault": str, "workers": int}
+
+
+def check_request(message):
+    if not isinstance(message, dict):
+        raise ValueError("a request is a JSON object")
+    if not isinstance(message.get("cmd"), str):
+        raise ValueError("cmd must be a string")
+    for key, kind in FIELDS.items():
+        value = message.get(key)
+        if value is not None and (not isinstance(value, kind) or isinstance(value, bool)):
+            raise ValueError(f"{key} has the wrong type")
+    return message
+
+
+class IPCServer(QObject):
+    def __init__(self, handler, parent=None):
+        super().__init__(parent)
+        self.handler = handler
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_new_connection)
+
+    def listen(self):
+        name = server_name()
+        if self.server.listen(name):
+            return True
+        # only called once forward_show() found nobody listening, so this is a stale socket
+        QLocalServer.removeServer(name)
+        return self.server.listen(name)
+
+    def close(self):
+        self.server.close()
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            connection.readyRead.connect(lambda connection=connection: self.on_ready_read(connection))
+            connection.disconnected.connect(connection.deleteLater)
+
+    def on_ready_read(self, connection):
+        while connection.canReadLine():
+            line = bytes(connection.readLine()).strip()
+            if not line:
+                continue
+            try:
+                message = check_request(json.loads(line))
+            except ValueError as e:
+                response = {"ok": False, "error": f"bad request: {e}"}
+            else:
+                try:
+                    response = self.handler(message)
+                except Exception as e:
+                    # an exception escaping a Qt slot aborts the whole tray process
+                    traceback.print_exc()
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            connection.write((json.dumps(response) + "\n").encode())
+        connection.flush()
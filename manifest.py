@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from config import CONFIG_FILE, TOTPConfig
+
+
+# {"vaults": [{"name": ..., "path": ...}, ...]}, relative paths are relative to the manifest, the first vault opens at startup
+MANIFEST_FILE = str(Path(CONFIG_FILE).with_name("aidex_vaults.json"))
+DEFAULT_VAULT = "default"
+# a vault nobody looked at for this long is closed and dropped from memory
+IDLE_UNLOAD = 600
+
+
+class VaultManifest:
+    def __init__(self, path=MANIFEST_FILE, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        # name -> config file path, in manifest order
+        self.vaults = self.load()
+        # only vaults opened since startup or their last unload
+        self.loaded = {}
+        self.last_used = {}
+
+    def load(self):
+        # without a manifest there is exactly the one config file aidex always had
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            base = os.path.dirname(os.path.abspath(self.path))
+            vaults = {str(item["name"]): os.path.join(base, os.path.expanduser(item["path"])) for item in data["vaults"]}
+        except FileNotFoundError:
+            vaults = {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"ignoring {self.path}: {e}", file=sys.stderr)
+            vaults = {}
+        return vaults or {DEFAULT_VAULT: CONFIG_FILE}
+
+    def save(self):
+        data = {"vaults": [{"name": name, "path": path} for name, path in self.vaults.items()]}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def names(self):
+        return list(self.vaults)
+
+    @property
+    def default(self):
+        return next(iter(self.vaults))
+
+    def open(self, name):
+        # the config file is parsed on first use, later calls return the same TOTPConfig
+        config_manager = self.loaded.get(name)
+        if config_manager is None:
+            config_manager = self.loaded[name] = TOTPConfig(self.vaults[name])
+        self.last_used[name] = self.clock()
+        return config_manager
+
+    def touch(self, name):
+        if name in self.loaded:
+            self.last_used[name] = self.clock()
+
+    def unload_idle(self, keep=None, timeout=IDLE_UNLOAD):
+        # -> names of the vaults closed, `keep` is the one on screen and always stays
+        now = self.clock()
+        unloaded = []
+        for name, used in list(self.last_used.items()):
+            if name != keep and now - used >= timeout:
+                del self.last_used[name]
+                self.loaded.pop(name).close()
+                unloaded.append(name)
+        return unloaded
+
+    def add(self, name, path):
+        self.vaults[name] = os.path.abspath(os.path.expanduser(path))
+        self.save()
+
+    def remove(self, name):
+        # the config file itself is left alone
+        del self.vaults[name]
+        config_manager = self.loaded.pop(name, None)
+        self.last_used.pop(name, None)
+        if config_manager is not None:
+            config_manager.close()
+        self.save()
+
+    def close(self):
+        for config_manager in self.loaded.values():
+            config_manager.close()
+        self.loaded.clear()
+        self.last_used.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="aidex vaults", description="List, add or remove named vault files.")
+    parser.add_argument("action", nargs="?", choices=["list", "add", "remove"], default="list")
+    parser.add_argument("name", nargs="?")
+    parser.add_argument("path", nargs="?", help="config file of the new vault")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="manifest file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    manifest = VaultManifest(args.manifest)
+    if args.action == "list":
+        for name, path in manifest.vaults.items():
+            print(f"{name}\t{path}")
+        return 0
+    if not args.name:
+        parser.error("a vault name is required")
+    if args.action == "add":
+        if not args.path:
+            parser.error("add needs the vault's config file")
+        if args.name in manifest.vaults:
+            print(f"a vault named {args.name!r} already exists", file=sys.stderr)
+            return 1
+        manifest.add(args.name, args.path)
+    else:
+        if args.name not in manifest.vaults:
+            print(f"no vault named {args.name!r}", file=sys.stderr)
+            return 1
+        if len(manifest.vaults) == 1:
+            print("the last vault cannot be removed", file=sys.stderr)
+            return 1
+        manifest.remove(args.name)
+    return 0
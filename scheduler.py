@@ -0,0 +1,122 @@
+import time
+from PyQt5.QtCore import QObject, QTimer, QRunnable, Qt, pyqtSignal
+import stats
+
+
+# wake a little after the boundary so the new counter is already current
+BOUNDARY_SLACK_MS = 5
+# how long before a boundary the next window's codes are computed in the background
+LOOKAHEAD_SECONDS = 3
+
+
+class LookAhead(QRunnable):
+    # fills the engine's second memo slot off the GUI thread, the rollover then only swaps values
+    def __init__(self, engine, period, boundary):
+        super().__init__()
+        self.engine = engine
+        self.period = period
+        self.boundary = boundary
+
+    def run(self):
+        start = time.perf_counter()
+        self.engine.prepare(self.boundary, self.period)
+        if stats.enabled:
+            stats.record("lookahead_ms", (time.perf_counter() - start) * 1000)
+
+
+class RefreshScheduler(QObject):
+    rollover = pyqtSignal(int)
+    tick = pyqtSignal()
+    # (period, unix time of the next boundary), emitted once per window LOOKAHEAD_SECONDS ahead
+    lookahead = pyqtSignal(int, float)
+
+    def __init__(self, clock=time.time, parent=None):
+        super().__init__(parent)
+        self.clock = clock
+        self.running = False
+        self.timers = {}
+        # monotonic time each timer is meant to fire at, for jitter stats
+        self.deadlines = {}
+        self.hmac_count = 0
+        self.prepared = {}
+
+        self.countdown_timer = QTimer(self)
+        self.countdown_timer.setSingleShot(True)
+        self.countdown_timer.timeout.connect(self.on_countdown)
+
+    def set_periods(self, periods):
+        periods = set(periods)
+        for period in list(self.timers):
+            if period not in periods:
+                self.timers.pop(period).stop()
+        for period in periods:
+            if period in self.timers:
+                continue
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.setTimerType(Qt.PreciseTimer)
+            timer.timeout.connect(lambda period=period: self.on_boundary(period))
+            self.timers[period] = timer
+            if self.running:
+                self.schedule(period)
+
+    def start(self):
+        self.running = True
+        for period in self.timers:
+            self.schedule(period)
+        self.schedule_countdown()
+
+    def stop(self):
+        self.running = False
+        for timer in self.timers.values():
+            timer.stop()
+        self.countdown_timer.stop()
+
+    def schedule(self, period):
+        delay = int((period - self.clock() % period) * 1000) + BOUNDARY_SLACK_MS
+        self.timers[period].start(delay)
+        if stats.enabled:
+            self.deadlines[period] = time.monotonic() + delay / 1000
+
+    def schedule_countdown(self):
+        delay = int((1 - self.clock() % 1) * 1000) + BOUNDARY_SLACK_MS
+        self.countdown_timer.start(delay)
+        if stats.enabled:
+            self.deadlines[None] = time.monotonic() + delay / 1000
+
+    def on_boundary(self, period):
+        if not self.running:
+            return
+        if stats.enabled:
+            self.record_tick(period, "rollover", self.rollover.emit, period)
+        else:
+            self.rollover.emit(period)
+        self.schedule(period)
+
+    def on_countdown(self):
+        if not self.running:
+            return
+        if stats.enabled:
+            self.record_tick(None, "tick", self.tick.emit)
+            # codes are computed lazily at paint time, so count what the previous second cost
+            hmac_count = stats.counters.get("hmac", 0)
+            stats.record("hmac_per_tick", hmac_count - self.hmac_count)
+            self.hmac_count = hmac_count
+        else:
+            self.tick.emit()
+        self.check_lookahead()
+        self.schedule_countdown()
+
+    def check_lookahead(self):
+        now = self.clock()
+        for period in self.timers:
+            boundary = (now // period + 1) * period
+            if boundary - now <= LOOKAHEAD_SECONDS and self.prepared.get(period) != boundary:
+                self.prepared[period] = boundary
+                self.lookahead.emit(period, boundary)
+
+    def record_tick(self, key, name, emit, *args):
+        start = time.monotonic()
+        stats.record(f"{name}_jitter_ms", (start - self.deadlines.get(key, start)) * 1000)
+        emit(*args)
+        stats.record(f"{name}_ms", (time.monotonic() - start) * 1000)
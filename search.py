@@ -0,0 +1,144 @@
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+
+TOKEN_SPLIT = re.compile(r"[\s\-_.,:;/@|()\[\]]+")
+# sorts after every character a name can contain, closes a prefix range
+PREFIX_END = "\U0010ffff"
+# a tier holding more than this share of all entries is walked in display order instead of collected and sorted
+SCAN_SHARE = 0.05
+
+
+def normalize(text):
+    return text.casefold().strip()
+
+
+def words(text):
+    return {word for word in TOKEN_SPLIT.split(text) if word}
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SortedPrefixIndex:
+    # (token, key) pairs kept sorted, so every token with a prefix is one contiguous slice
+    def __init__(self):
+        self.items = []
+
+    def add(self, token, key):
+        insort(self.items, (token, key))
+
+    def remove(self, token, key):
+        i = bisect_left(self.items, (token, key))
+        if i < len(self.items) and self.items[i] == (token, key):
+            del self.items[i]
+
+    def build(self, pairs):
+        self.items = sorted(pairs)
+
+    def bounds(self, prefix):
+        lo = bisect_left(self.items, (prefix,))
+        return lo, bisect_left(self.items, (prefix + PREFIX_END,), lo)
+
+    def count(self, prefix):
+        # pairs, not keys, a key with two words under the prefix counts twice
+        lo, hi = self.bounds(prefix)
+        return hi - lo
+
+    def matches(self, prefix):
+        lo, hi = self.bounds(prefix)
+        return {key for _, key in self.items[lo:hi]}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.names = SortedPrefixIndex()
+        self.words = SortedPrefixIndex()
+        self.grams = defaultdict(set)
+        self.texts = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def build(self, entries):
+        # bulk load of (key, text) pairs, much cheaper than adding one at a time
+        names, word_pairs = [], []
+        for key, text in entries:
+            text = normalize(text)
+            self.texts[key] = text
+            names.append((text, key))
+            word_pairs.extend((word, key) for word in words(text))
+            for gram in trigrams(text):
+                self.grams[gram].add(key)
+        self.names.build(names)
+        self.words.build(word_pairs)
+
+    def add(self, key, text):
+        text = normalize(text)
+        self.texts[key] = text
+        self.names.add(text, key)
+        for word in words(text):
+            self.words.add(word, key)
+        for gram in trigrams(text):
+            self.grams[gram].add(key)
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        self.names.remove(text, key)
+        for word in words(text):
+            self.words.remove(word, key)
+        for gram in trigrams(text):
+            keys = self.grams.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.grams[gram]
+
+    def update(self, key, text):
+        self.remove(key)
+        self.add(key, text)
+
+    def substring_matches(self, query):
+        if len(query) < 3:
+            return set()
+        candidates = None
+        for gram in sorted(trigrams(query), key=lambda gram: len(self.grams.get(gram, ()))):
+            keys = self.grams.get(gram)
+            if not keys:
+                return set()
+            candidates = set(keys) if candidates is None else candidates & keys
+        if len(query) == 3:
+            return candidates
+        # every trigram can be present without the query being contiguous
+        texts = self.texts
+        return {key for key in candidates if query in texts[key]}
+
+    def query(self, text, positions):
+        # -> keys best first, lazily: the name starts with the query, then a word in it does, then it appears anywhere.
+        # `positions` maps every key to its display position in display order, each tier comes out in that order.
+        # A short query matches most entries, so a large tier is walked in display order and only as far as it is read.
+        query = normalize(text)
+        if not query:
+            return
+        texts = self.texts
+        large = len(positions) * SCAN_SHARE
+
+        def in_order(keys):
+            if len(keys) > large:
+                return (key for key in positions if key in keys)
+            return sorted(keys, key=positions.__getitem__)
+
+        if self.names.count(query) > large:
+            # the index may change under a half-read query, a removed key has no text left
+            yield from (key for key in positions if texts.get(key, "").startswith(query))
+        else:
+            yield from in_order(self.names.matches(query))
+        # later tiers are only collected once the view reads that far
+        starts = self.names.matches(query)
+        word_starts = self.words.matches(query) - starts
+        yield from in_order(word_starts)
+        yield from in_order(self.substring_matches(query) - starts - word_starts)
@@ -0,0 +1,32 @@
+import os
+import sys
+import time
+
+
+# set AIDEX_STARTUP_TRACE=1 to print the breakdown to stderr once startup finishes
+enabled = bool(os.environ.get("AIDEX_STARTUP_TRACE"))
+phases = []
+
+
+def mark(phase):
+    phases.append((phase, time.perf_counter()))
+
+
+def breakdown():
+    if not phases:
+        return []
+    start = previous = phases[0][1]
+    result = []
+    for phase, at in phases:
+        result.append({"phase": phase, "ms": (at - previous) * 1000, "total_ms": (at - start) * 1000})
+        previous = at
+    return result
+
+
+def report(stream=None):
+    if not enabled:
+        return
+    stream = stream or sys.stderr
+    for item in breakdown():
+        stream.write(f"{item['phase']:<24}{item['ms']:9.1f} ms{item['total_ms']:10.1f} ms\n")
+    stream.flush()
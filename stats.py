@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+from collections import deque
+
+
+# AIDEX_STATS=1 turns collection on, AIDEX_STATS_FILE=path additionally writes a JSON dump there on exit.
+# When off, timed() hands back the undecorated function and every other hook is behind `if stats.enabled`.
+enabled = bool(os.environ.get("AIDEX_STATS"))
+SAMPLES = 512
+
+lock = threading.Lock()
+started = time.time()
+counters = {}
+series = {}
+
+
+class Series:
+    __slots__ = ("count", "total", "min", "max", "last", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+        self.samples = deque(maxlen=SAMPLES)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+        self.samples.append(value)
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+            "last": self.last,
+            "p50": samples[len(samples) // 2],
+            "p95": samples[min(len(samples) - 1, len(samples) * 95 // 100)],
+        }
+
+
+def count(name, n=1):
+    with lock:
+        counters[name] = counters.get(name, 0) + n
+
+
+def record(name, value):
+    with lock:
+        entry = series.get(name)
+        if entry is None:
+            entry = series[name] = Series()
+        entry.add(value)
+
+
+def timed(name):
+    # records the call duration in milliseconds under `name`
+    def decorator(func):
+        if not enabled:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    with lock:
+        return {
+            "enabled": enabled,
+            "pid": os.getpid(),
+            "uptime_s": time.time() - started,
+            "counters": dict(counters),
+            "series": {name: entry.summary() for name, entry in series.items()},
+        }
+
+
+def dump(path):
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=4)
+
+
+def format_snapshot(data):
+    lines = [f"uptime {data['uptime_s']:.0f} s, pid {data['pid']}", ""]
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"{name:<28}{value:>12}")
+    lines.append("")
+    for name, summary in sorted(data["series"].items()):
+        lines.append(f"{name:<28}n={summary['count']:<8}p50={summary['p50']:<10.3f}"
+                     f"p95={summary['p95']:<10.3f}max={summary['max']:.3f}")
+    return "\n".join(lines)
+
+
+def install_exit_dump():
+    # only the tray process dumps, not the short-lived command line clients
+    if enabled and os.environ.get("AIDEX_STATS_FILE"):
+        atexit.register(dump, os.environ["AIDEX_STATS_FILE"])
@@ -0,0 +1,429 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+import stats
+from entry import Entry
+
+
+JOURNAL_SUFFIX = ".journal"
+# how long a burst of edits may pile up before it is written, and the journal length that triggers compaction
+FLUSH_DELAY = 0.2
+COMPACT_THRESHOLD = 256
+# a journal left alone this long is folded into the snapshot, so other readers of the JSON see the edits
+COMPACT_DELAY = 5.0
+# longest wait between retries while the journal cannot be written
+RETRY_MAX = 30
+
+
+def find(configs, op):
+    # journals written before entries had ids refer to them by index
+    if "index" in op:
+        return op["index"]
+    entry_id = op["id"]
+    for index, config in enumerate(configs):
+        if config.id == entry_id:
+            return index
+    raise KeyError(entry_id)
+
+
+def apply_op(configs, op):
+    kind = op["op"]
+    if kind == "add":
+        configs.append(op["entry"])
+    elif kind == "extend":
+        configs.extend(op["entries"])
+    elif kind == "update":
+        configs[find(configs, op)] = op["entry"]
+    elif kind == "delete":
+        del configs[find(configs, op)]
+    elif kind == "move":
+        configs.insert(op["to"], configs.pop(find(configs, op)))
+    elif kind == "replace":
+        configs[:] = op["entries"]
+    elif kind == "counter":
+        index = find(configs, op)
+        configs[index] = configs[index].replace(counter=op["counter"])
+    else:
+        raise ValueError(f"unknown journal op {kind!r}")
+
+
+def replace_as_ops(ours, entries):
+    # a whole list written over `ours`, as the adds, updates and deletes it amounts to
+    before = {config.id: config for config in ours}
+    after = {entry.id for entry in entries}
+    ops = [{"op": "delete", "id": entry_id} for entry_id in before if entry_id not in after]
+    for entry in entries:
+        if entry.id not in before:
+            ops.append({"op": "add", "entry": entry})
+        elif before[entry.id] != entry:
+            ops.append({"op": "update", "id": entry.id, "entry": entry})
+    return ops
+
+
+def replay_ops(configs, ops, base):
+    # our own ops, which started from `base`, replayed onto a snapshot someone else wrote,
+    # -> (the ops as they now apply, number of edits that no longer apply)
+    ours = list(base)
+    kept, dropped = [], 0
+    for op in ops:
+        if op["op"] == "replace":
+            # only what it changed on our side is carried over, not the rest of our old list
+            steps = replace_as_ops(ours, op["entries"])
+        else:
+            steps = [op]
+        try:
+            apply_op(ours, op)
+        except (KeyError, IndexError, ValueError):
+            # never applied on our side either
+            continue
+        for step in steps:
+            kind = step["op"]
+            if kind in ("add", "extend"):
+                # the other side may have the entry already, from a synced copy of one of our snapshots
+                present = {config.id for config in configs}
+                entries = [entry for entry in (step["entries"] if kind == "extend" else [step["entry"]]) if entry.id not in present]
+                if not entries:
+                    continue
+                step = {"op": "extend", "entries": entries}
+            elif "index" in step:
+                # a position in our old list says nothing about theirs
+                dropped += 1
+                continue
+            elif not any(config.id == step["id"] for config in configs):
+                # deleted on the other side, a delete or a move of it has nothing left to do
+                if kind in ("update", "counter"):
+                    dropped += 1
+                continue
+            apply_op(configs, step)
+            kept.append(step)
+    return kept, dropped
+
+
+def decode_op(op):
+    if "entry" in op:
+        op["entry"] = Entry.from_dict(op["entry"])
+    if "entries" in op:
+        op["entries"] = [Entry.from_dict(entry) for entry in op["entries"]]
+    return op
+
+
+def file_stat(st):
+    return st.st_mtime_ns, st.st_size
+
+
+def fsync_directory(path):
+    # makes the rename itself durable, not possible on Windows
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# The snapshot is the plain JSON config file, mutations since the last compaction are
+# appended to a journal next to it. The journal starts with a header naming the sha256 of
+# the snapshot it applies to, so a journal that was already folded into a newer snapshot
+# (or whose snapshot was replaced by someone else) is ignored on load.
+class JournalStore:
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.lock = threading.Condition()
+        self.pending = []
+        self.state = []
+        # the entries the journal's ops start from and how many leading ops are already part of them, see rebase
+        self.base = []
+        self.base_ops = 0
+        self.snapshot_hash = None
+        # (mtime, size) of the snapshot as last read or written, see snapshot_changed
+        self.snapshot_stat = None
+        self.journal_ops = 0
+        # journal length at which the next compaction is due, pushed back when one fails
+        self.compact_at = COMPACT_THRESHOLD
+        # a failed quiet compaction waits for the next write before it is tried again
+        self.compact_when_quiet = True
+        self.needs_header = True
+        # end of the last intact op when the journal has a torn or unusable tail, cut off before the next append
+        self.journal_end = None
+        self.writing = False
+        self.flushing = False
+        self.closed = False
+        self.error = None
+        self.failures = 0
+        self.thread = None
+        self.pending_since = None
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+                self.snapshot_stat = file_stat(os.fstat(f.fileno()))
+        except FileNotFoundError:
+            data = b""
+            self.snapshot_stat = None
+        self.snapshot_hash = hashlib.sha256(data).hexdigest()
+        content = data.decode("utf-8").strip()
+
+        ops, ends = self.read_journal()
+        # a replace op supersedes the snapshot and every op before it, only what it leaves gets decoded
+        start = max((count for count, op in enumerate(ops) if op.get("op") == "replace"), default=0)
+        configs = [] if start or not content else [Entry.from_dict(config) for config in json.loads(content)]
+        self.base = list(configs)
+        self.base_ops = start
+        for count, op in enumerate(ops[start:], start):
+            try:
+                apply_op(configs, decode_op(op))
+            except (KeyError, IndexError, ValueError):
+                ops = ops[:count]
+                break
+        if not self.needs_header and len(ops) < len(ends) - 1:
+            self.journal_end = ends[len(ops)]
+        # entries are immutable, sharing them with the caller costs one list and no copies
+        self.state = list(configs)
+        self.journal_ops = len(ops)
+        return configs
+
+    def rebase(self, prepare=None):
+        # the snapshot was replaced by someone else: load it and replay our ops since the last compaction on top,
+        # none of them made it into any snapshot yet. -> (entries, ops replayed, ops that no longer apply)
+        # The lock keeps the writer from compacting our old state over the new snapshot meanwhile.
+        with self.lock:
+            self.flush()
+            while self.writing:
+                self.lock.wait()
+            unwritten, self.pending = self.pending, []
+            ops, _ = self.read_journal()
+            local = [decode_op(op) for op in ops[self.base_ops:self.journal_ops]] + unwritten
+            base = self.base
+            configs = self.load()
+            if prepare is not None:
+                prepare(configs)
+            kept, dropped = replay_ops(configs, local, base)
+            for op in kept:
+                self.append(op)
+        return configs, len(kept), dropped
+
+    def snapshot_changed(self):
+        # True once someone else replaced the snapshot, the hash is only computed when the metadata moved
+        try:
+            stat = file_stat(os.stat(self.path))
+        except FileNotFoundError:
+            return False
+        if stat == self.snapshot_stat:
+            return False
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() == self.snapshot_hash:
+            self.snapshot_stat = stat
+            return False
+        return True
+
+    def read_journal(self):
+        # -> (ops, ends), ends[i] is the byte offset where op i starts, ends[-1] where the intact part stops
+        self.needs_header = True
+        self.journal_end = None
+        try:
+            with open(self.journal_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return [], []
+        # only newline terminated lines were ever acknowledged, an unterminated last one is torn
+        lines = data.split(b"\n")[:-1]
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return [], []
+        if header.get("base") != self.snapshot_hash:
+            return [], []
+
+        self.needs_header = False
+        ops = []
+        ends = [len(lines[0]) + 1]
+        for line in lines[1:]:
+            try:
+                ops.append(json.loads(line))
+            except ValueError:
+                # a torn write at the tail, everything before it is intact
+                break
+            ends.append(ends[-1] + len(line) + 1)
+        if ends[-1] < len(data):
+            self.journal_end = ends[-1]
+        return ops, ends
+
+    def append(self, op):
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("config store is closed")
+            if not self.pending:
+                self.pending_since = time.perf_counter()
+            last = self.pending[-1] if self.pending else None
+            if op["op"] == "counter" and last is not None and last["op"] == "counter" and last["id"] == op["id"]:
+                # a burst of HOTP codes only needs its newest counter on disk
+                self.pending[-1] = op
+            else:
+                self.pending.append(op)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="aidex-config-writer", daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+            self.lock.notify_all()
+
+    def flush(self):
+        # -> True once every op appended so far is on disk, False while the journal cannot be written (see `error`)
+        with self.lock:
+            self.flushing = True
+            self.lock.notify_all()
+            while (self.pending or self.writing) and self.error is None and self.thread is not None and self.thread.is_alive():
+                self.lock.wait()
+            self.flushing = False
+            return not (self.pending or self.writing)
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.lock.notify_all()
+        # the exit hook would otherwise keep an unloaded vault and all its entries alive
+        atexit.unregister(self.close)
+        if self.thread is not None:
+            self.thread.join()
+            self.write(self.pending)
+            self.pending = []
+            if self.journal_ops:
+                self.compact()
+
+    def run(self):
+        while True:
+            with self.lock:
+                quiet_until = time.monotonic() + COMPACT_DELAY
+                while not self.pending and not self.closed:
+                    if not (self.journal_ops and self.compact_when_quiet):
+                        self.lock.wait()
+                        continue
+                    remaining = quiet_until - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.lock.wait(remaining)
+                if self.closed:
+                    return
+                # nothing came in for COMPACT_DELAY, only a compaction is due
+                quiet = not self.pending
+                self.writing = quiet
+            if quiet:
+                self.compact_quietly()
+                continue
+            with self.lock:
+                # let a burst of edits pile up so it shares one write and one fsync, back off while writes fail
+                deadline = time.monotonic() + min(FLUSH_DELAY * 2 ** min(self.failures, 16), RETRY_MAX)
+                # a flush skips the delay, but not the backoff: it returns on the error anyway
+                while not (self.closed or (self.flushing and not self.failures)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.lock.wait(remaining)
+                if self.closed:
+                    return
+                ops, self.pending = self.pending, []
+                pending_since = self.pending_since
+                self.writing = True
+            try:
+                self.write(ops)
+            except OSError as e:
+                # write() left nothing of these ops in the journal, they go out again with the next batch
+                self.error = e
+                self.failures += 1
+                with self.lock:
+                    self.pending[:0] = ops
+                    self.writing = False
+                    self.lock.notify_all()
+                continue
+            self.error = None
+            self.failures = 0
+            self.compact_when_quiet = True
+            if stats.enabled:
+                # from the first queued edit until it is on disk
+                stats.record("config_save_latency_ms", (time.perf_counter() - pending_since) * 1000)
+                stats.record("config_ops_per_write", len(ops))
+            try:
+                if self.journal_ops >= self.compact_at:
+                    self.compact()
+            except OSError:
+                # the ops are safe in the journal, compaction is tried again once it has grown some more
+                self.compact_at = self.journal_ops + COMPACT_THRESHOLD
+            finally:
+                with self.lock:
+                    self.writing = False
+                    self.lock.notify_all()
+
+    def compact_quietly(self):
+        try:
+            self.compact()
+        except OSError:
+            # the ops are safe in the journal, the next write brings the next attempt
+            self.compact_when_quiet = False
+        finally:
+            with self.lock:
+                self.writing = False
+                self.lock.notify_all()
+
+    @stats.timed("config_write_ms")
+    def write(self, ops):
+        if not ops:
+            return
+        lines = [json.dumps(op, default=Entry.to_dict) + "\n" for op in ops]
+        if self.needs_header:
+            lines.insert(0, json.dumps({"base": self.snapshot_hash}) + "\n")
+        elif self.journal_end is not None:
+            # drop the torn tail found on load, or the first op appended would be glued onto it
+            os.truncate(self.journal_path, self.journal_end)
+            self.journal_end = None
+        with open(self.journal_path, "wb" if self.needs_header else "ab") as f:
+            start = f.tell()
+            try:
+                f.write("".join(lines).encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError:
+                # a partial line left here would swallow the retry
+                try:
+                    f.truncate(start)
+                except OSError:
+                    pass
+                raise
+        self.needs_header = False
+        for op in ops:
+            apply_op(self.state, op)
+        self.journal_ops += len(ops)
+
+    @stats.timed("config_compact_ms")
+    def compact(self):
+        data = json.dumps(self.state, indent=4, default=Entry.to_dict).encode("utf-8")
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # a crash from here on leaves a journal whose base no longer matches, which load ignores,
+        # and so does a failure below: the next write starts the journal over with a new header
+        self.snapshot_hash = hashlib.sha256(data).hexdigest()
+        self.needs_header = True
+        self.journal_ops = 0
+        self.base = list(self.state)
+        self.base_ops = 0
+        self.compact_at = COMPACT_THRESHOLD
+        fsync_directory(self.path)
+        self.snapshot_stat = file_stat(os.stat(self.path))
+
+        with open(self.journal_path, "wb") as f:
+            f.write((json.dumps({"base": self.snapshot_hash}) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.needs_header = False
+        self.journal_end = None
@@ -0,0 +1,430 @@
+from PyQt5.QtWidgets import QApplication, QTableView, QAbstractItemView, QStyledItemDelegate, QStyleOptionViewItem, QStyle
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QRect, pyqtSignal
+from PyQt5.QtGui import QDrag, QPainter, QColor, QPen
+from itertools import islice
+from search import SearchIndex
+from vault import VaultError, VaultLocked
+import stats
+
+
+NAME_COLUMN, TOTP_COLUMN, TIME_COLUMN, ACTION_COLUMN = range(4)
+# the code tooltip shows the upcoming code once this few seconds are left
+NEXT_CODE_SECONDS = 5
+# search results are read this many at a time, the view asks for more as it scrolls to the end
+SEARCH_PAGE = 50
+
+
+class TOTPTableModel(QAbstractTableModel):
+    HEADERS = ["Name", "TOTP", "Time Left", "Action"]
+
+    def __init__(self, config_manager, engine, parent=None):
+        super().__init__(parent)
+        self.config_manager = config_manager
+        self.engine = engine
+        # entry ids shown while a search is active, best match first, and the rest of the matches still unread
+        self.visible = None
+        self.pending = None
+        self.query = ""
+        # built on the first search and kept up to date from then on
+        self.search_index = None
+        self.positions = None
+
+    def config_at(self, row):
+        if self.visible is None:
+            return self.config_manager.configs[row]
+        return self.config_manager.by_id[self.visible[row]]
+
+    def position(self, row):
+        if self.visible is None:
+            return row
+        return self.key_positions()[self.visible[row]]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self.visible is not None:
+            return len(self.visible)
+        return len(self.config_manager.configs)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.pending is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.pending is None:
+            return
+        # entries edited or deleted since the search ran may come up again or not at all
+        shown = set(self.visible)
+        by_id = self.config_manager.by_id
+        batch = list(islice(self.pending, SEARCH_PAGE))
+        if len(batch) < SEARCH_PAGE:
+            self.pending = None
+        keys = [key for key in batch if key in by_id and key not in shown]
+        if keys:
+            first = len(self.visible)
+            self.beginInsertRows(QModelIndex(), first, first + len(keys) - 1)
+            self.visible.extend(keys)
+            self.endInsertRows()
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled | Qt.ItemIsDropEnabled
+
+    def supportedDropActions(self):
+        return Qt.MoveAction
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role == Qt.ToolTipRole and index.column() == TOTP_COLUMN:
+            return self.next_code(index.row())
+        if role != Qt.DisplayRole:
+            return None
+
+        config = self.config_at(index.row())
+        column = index.column()
+        if column == NAME_COLUMN:
+            return config.name
+        if column == ACTION_COLUMN:
+            return "≡"
+        # only rows the view actually paints get here, so codes are computed lazily
+        try:
+            totp = self.engine.compile_config(config, self.config_manager.secret(config))
+        except VaultLocked:
+            return "Locked" if column == TOTP_COLUMN else ""
+        except (ValueError, VaultError):
+            return "Invalid secret" if column == TOTP_COLUMN else ""
+        if config.counter is not None:
+            # HOTP codes stay until one is copied, the time column shows the counter instead
+            return totp.code(config.counter) if column == TOTP_COLUMN else f"#{config.counter}"
+        now = self.engine.clock()
+        if column == TOTP_COLUMN:
+            return totp.at(now)
+        return str(totp.time_remaining(now))
+
+    def next_code(self, row):
+        config = self.config_at(row)
+        secret = self.config_manager.cached_secret(config)
+        if secret is None or config.counter is not None:
+            return None
+        try:
+            totp = self.engine.compile_config(config, secret)
+        except ValueError:
+            return None
+        now = self.engine.clock()
+        if totp.time_remaining(now) > NEXT_CODE_SECONDS:
+            return None
+        counter = totp.timecode(now) + 1
+        # normally already there from the look-ahead
+        return f"Next: {totp.peek(counter) or totp.generate(counter)}"
+
+    def refresh_codes(self):
+        rows = self.rowCount()
+        if rows:
+            self.dataChanged.emit(self.index(0, TOTP_COLUMN), self.index(rows - 1, TIME_COLUMN), [Qt.DisplayRole])
+
+    def refresh_times(self):
+        rows = self.rowCount()
+        if rows:
+            self.dataChanged.emit(self.index(0, TIME_COLUMN), self.index(rows - 1, TIME_COLUMN), [Qt.DisplayRole])
+
+    def periods(self):
+        # HOTP entries never roll over
+        return {config.interval for config in self.config_manager.configs if config.counter is None}
+
+    def build_search_index(self):
+        if self.search_index is None:
+            self.search_index = SearchIndex()
+            self.search_index.build((config.id, config.name) for config in self.config_manager.configs)
+
+    def search(self, text):
+        self.query = text.strip()
+        pending = keys = None
+        if self.query:
+            self.build_search_index()
+            pending = self.search_index.query(self.query, self.key_positions())
+            keys = list(islice(pending, SEARCH_PAGE))
+            if len(keys) < SEARCH_PAGE:
+                pending = None
+
+        self.beginResetModel()
+        self.visible = keys
+        self.pending = pending
+        self.endResetModel()
+
+    def row_of(self, entry_id):
+        # the entry's current row, None once it is gone or hidden by the search
+        position = self.key_positions().get(entry_id)
+        if position is None or self.visible is None:
+            return position
+        if entry_id not in self.visible:
+            # further down the matches than the view has read so far
+            while self.pending is not None and entry_id not in self.visible:
+                self.fetchMore()
+        try:
+            return self.visible.index(entry_id)
+        except ValueError:
+            return None
+
+    def key_positions(self):
+        # rebuilt lazily after a delete or a move, only searches need it
+        if self.positions is None:
+            self.positions = {config.id: position for position, config in enumerate(self.config_manager.configs)}
+        return self.positions
+
+    def reload(self):
+        self.beginResetModel()
+        self.engine.retain(self.config_manager.cached_secret(config) for config in self.config_manager.configs)
+        self.search_index = None
+        self.positions = None
+        self.visible = None
+        self.pending = None
+        self.endResetModel()
+        if stats.enabled:
+            stats.count("rows_rebuilt", len(self.config_manager.configs))
+        if self.query:
+            self.search(self.query)
+
+    def add_config(self, name, secret, prefix="", suffix=""):
+        self.add_configs([{"name": name, "secret": secret, "prefix": prefix, "suffix": suffix}])
+
+    def add_configs(self, entries):
+        # entries are sealed first, a VaultLocked from there must not leave the view inside beginInsertRows
+        added = self.config_manager.new_entries(entries)
+        if not added:
+            return
+        first = len(self.config_manager.configs)
+        if self.visible is None:
+            self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+        self.config_manager.append_entries(added)
+        if self.positions is not None:
+            self.positions.update((config.id, first + offset) for offset, config in enumerate(added))
+        if self.search_index is not None:
+            for config in added:
+                self.search_index.add(config.id, config.name)
+        if self.visible is None:
+            self.endInsertRows()
+        else:
+            # a new entry only shows up once it matches the current search
+            self.search(self.query)
+
+    def update_config(self, row, name, secret, prefix="", suffix=""):
+        position = self.position(row)
+        old = self.config_manager.configs[position]
+        old_secret = self.config_manager.cached_secret(old)
+        self.config_manager.update_config(position, name, secret, prefix, suffix)
+        if old_secret is not None and old_secret != secret:
+            self.engine.forget(old_secret)
+        # the entry keeps its id, so positions and the visible rows stay valid
+        if self.search_index is not None:
+            self.search_index.update(old.id, name)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, ACTION_COLUMN))
+
+    def advance_counter(self, row):
+        self.config_manager.advance_counter(self.position(row))
+        self.dataChanged.emit(self.index(row, TOTP_COLUMN), self.index(row, TIME_COLUMN), [Qt.DisplayRole])
+
+    def delete_config(self, row):
+        position = self.position(row)
+        config = self.config_manager.configs[position]
+        secret = self.config_manager.cached_secret(config)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.config_manager.delete_config(position)
+        if self.visible is not None:
+            del self.visible[row]
+        self.endRemoveRows()
+        if secret is not None:
+            self.engine.forget(secret)
+        self.positions = None
+        if self.search_index is not None:
+            self.search_index.remove(config.id)
+
+    def drop_secret(self, config):
+        secret = self.config_manager.cached_secret(config)
+        if secret is not None:
+            self.engine.forget(secret)
+        self.config_manager.secrets.pop(config.id, None)
+
+    def apply_changes(self, configs):
+        # patches the rows into the new order: removals, then moves and inserts position by position,
+        # updates in place. While a search is active the rows are patched silently and the search re-run.
+        current = self.config_manager.configs
+        signals = self.visible is None
+        wanted = {config.id for config in configs}
+        changed = []
+
+        for row in range(len(current) - 1, -1, -1):
+            config = current[row]
+            if config.id not in wanted:
+                if signals:
+                    self.beginRemoveRows(QModelIndex(), row, row)
+                del current[row]
+                if signals:
+                    self.endRemoveRows()
+                self.drop_secret(config)
+                changed.append((config.id, None))
+
+        for row, config in enumerate(configs):
+            source = next((i for i in range(row, len(current)) if current[i].id == config.id), None)
+            if source is None:
+                if signals:
+                    self.beginInsertRows(QModelIndex(), row, row)
+                current.insert(row, config)
+                if signals:
+                    self.endInsertRows()
+                changed.append((config.id, config.name))
+                continue
+            if source != row:
+                if signals:
+                    self.beginMoveRows(QModelIndex(), source, source, QModelIndex(), row)
+                current.insert(row, current.pop(source))
+                if signals:
+                    self.endMoveRows()
+            old = current[row]
+            current[row] = config
+            if old != config:
+                self.drop_secret(old)
+                changed.append((config.id, config.name))
+                if signals:
+                    self.dataChanged.emit(self.index(row, 0), self.index(row, ACTION_COLUMN))
+
+        self.config_manager.adopt(current)
+        self.positions = None
+        if self.search_index is not None:
+            for entry_id, name in changed:
+                if name is None:
+                    self.search_index.remove(entry_id)
+                else:
+                    self.search_index.update(entry_id, name)
+        if stats.enabled:
+            stats.count("external_reloads")
+            stats.count("rows_patched", len(changed))
+        if not signals:
+            self.search(self.query)
+
+    def moveRows(self, sourceParent, sourceRow, count, destinationParent, destinationChild):
+        # reordering a filtered subset has no sensible meaning for the full list
+        if self.visible is not None:
+            return False
+        if not self.beginMoveRows(sourceParent, sourceRow, sourceRow + count - 1, destinationParent, destinationChild):
+            return False
+        # every moved entry is persisted as one small journal op instead of rewriting the list
+        if destinationChild > sourceRow:
+            for _ in range(count):
+                self.config_manager.move_config(sourceRow, destinationChild - 1)
+        else:
+            for offset in range(count):
+                self.config_manager.move_config(sourceRow + offset, destinationChild + offset)
+        self.positions = None
+        self.endMoveRows()
+        return True
+
+
+class ActionDelegate(QStyledItemDelegate):
+    clicked = pyqtSignal(int)
+
+    def button_rect(self, option):
+        rect = QRect(0, 0, 30, 25)
+        rect.moveCenter(option.rect.center())
+        return rect
+
+    def paint(self, painter, option, index):
+        # draw the cell background and selection, then a button in place of the text
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        text = opt.text
+        opt.text = ""
+        style = opt.widget.style() if opt.widget else QApplication.style()
+        style.drawControl(QStyle.CE_ItemViewItem, opt, painter, opt.widget)
+
+        color = QColor("#00ffdf") if option.state & QStyle.State_MouseOver else QColor("#1de9b6")
+        font = painter.font()
+        font.setPixelSize(13)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(QPen(color, 2 if option.state & QStyle.State_MouseOver else 1))
+        painter.setBrush(Qt.NoBrush)
+        painter.setFont(font)
+        rect = self.button_rect(option)
+        painter.drawRoundedRect(rect, 8, 8)
+        painter.drawText(rect, Qt.AlignCenter, text)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton
+                and self.button_rect(option).contains(event.pos())):
+            self.clicked.emit(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+class DraggableTableView(QTableView):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setDragEnabled(True)
+        self.setAcceptDrops(True)
+        self.viewport().setAcceptDrops(True)
+        self.setDragDropOverwriteMode(False)
+        self.setDropIndicatorShown(True)
+
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setDragDropMode(QAbstractItemView.InternalMove)
+
+        self.drag_start_position = None
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_start_position = event.pos()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if not (event.buttons() & Qt.LeftButton) or self.drag_start_position is None:
+            return
+        if (event.pos() - self.drag_start_position).manhattanLength() < QApplication.startDragDistance():
+            return
+
+        drag = QDrag(self)
+        mimedata = self.model().mimeData(self.selectedIndexes())
+
+        if mimedata:
+            drag.setMimeData(mimedata)
+            drag.exec_(Qt.MoveAction)
+
+    def dropEvent(self, event):
+        if event.source() == self and (event.dropAction() == Qt.MoveAction or self.dragDropMode() == QAbstractItemView.InternalMove):
+            success, row, col, topIndex = self.dropOn(event)
+            if success:
+                selRows = self.getSelectedRowsFast()
+                if not selRows:
+                    return
+                top = selRows[0]
+
+                dropRow = row
+                if dropRow == -1:
+                    dropRow = self.model().rowCount()
+                # the model applies the move as a single beginMoveRows/endMoveRows patch
+                if self.model().moveRows(QModelIndex(), top, len(selRows), QModelIndex(), dropRow):
+                    event.accept()
+
+    def getSelectedRowsFast(self):
+        return sorted({index.row() for index in self.selectedIndexes()})
+
+    def dropOn(self, event):
+        index = self.indexAt(event.pos())
+        if not index.isValid():
+            return False, self.model().rowCount(), 0, index
+        return True, index.row(), index.column(), index
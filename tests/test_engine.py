@@ -0,0 +1,128 @@
+import sys
+import base64
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import batch
+from engine import CompiledTOTP, TOTPEngine
+from entry import Entry
+
+
+def b32(seed):
+    return base64.b32encode(seed).decode()
+
+
+# RFC 4226 appendix D
+HOTP_SECRET = b32(b"12345678901234567890")
+HOTP_CODES = ["755224", "287082", "359152", "969429", "338314", "254676", "287922", "162583", "399871", "520489"]
+
+# RFC 6238 appendix B, 8 digits and a 30 s step, each algorithm with its own seed
+TOTP_SECRETS = {
+    "sha1": b32(b"12345678901234567890"),
+    "sha256": b32(b"12345678901234567890123456789012"),
+    "sha512": b32(b"1234567890123456789012345678901234567890123456789012345678901234"),
+}
+TOTP_TIMES = [59, 1111111109, 1111111111, 1234567890, 2000000000, 20000000000]
+TOTP_CODES = {
+    "sha1": ["94287082", "07081804", "14050471", "89005924", "69279037", "65353130"],
+    "sha256": ["46119246", "68084774", "67062674", "91819424", "90698825", "77737706"],
+    "sha512": ["90693936", "25091201", "99943326", "93441116", "38618901", "47863826"],
+}
+
+
+class CompiledTOTPTest(unittest.TestCase):
+    def test_hotp_vectors(self):
+        totp = CompiledTOTP(HOTP_SECRET, interval=None)
+        self.assertEqual([totp.code(counter) for counter in range(10)], HOTP_CODES)
+
+    def test_totp_vectors(self):
+        for algorithm, secret in TOTP_SECRETS.items():
+            totp = CompiledTOTP(secret, 30, 8, algorithm)
+            with self.subTest(algorithm=algorithm):
+                self.assertEqual([totp.at(for_time) for for_time in TOTP_TIMES], TOTP_CODES[algorithm])
+
+    def test_interval_and_digits(self):
+        totp = CompiledTOTP(TOTP_SECRETS["sha1"], 60, 6)
+        # one 60 s step is two 30 s steps, and 6 digits are the low digits of the 8 digit code
+        self.assertEqual(totp.timecode(1111111109), 1111111109 // 60)
+        self.assertEqual(totp.at(1111111109), CompiledTOTP(TOTP_SECRETS["sha1"], 30, 8).code(1111111109 // 60)[-6:])
+        self.assertEqual(totp.time_remaining(1111111109), 60 - 1111111109 % 60 + 1)
+
+    def test_invalid_input(self):
+        with self.assertRaises(ValueError):
+            CompiledTOTP(HOTP_SECRET, algorithm="md5")
+        with self.assertRaises(ValueError):
+            CompiledTOTP("not base32!")
+
+    def test_prepared_code_is_swapped_in(self):
+        totp = CompiledTOTP(HOTP_SECRET, interval=None)
+        self.assertIsNone(totp.peek(3))
+        totp.prepare(3)
+        self.assertEqual(totp.peek(3), HOTP_CODES[3])
+        with mock.patch.object(CompiledTOTP, "generate", side_effect=AssertionError("computed again")):
+            self.assertEqual(totp.code(3), HOTP_CODES[3])
+            # the memo answers a repeat without the look-ahead
+            self.assertEqual(totp.code(3), HOTP_CODES[3])
+        self.assertEqual(totp.code(4), HOTP_CODES[4])
+        # a stale look-ahead is never handed out for another counter
+        totp.prepare(6)
+        self.assertEqual(totp.code(5), HOTP_CODES[5])
+        self.assertIsNone(totp.peek(7))
+
+
+class TOTPEngineTest(unittest.TestCase):
+    def test_compiled_entries_are_shared_and_dropped(self):
+        engine = TOTPEngine(clock=lambda: 59)
+        entry = engine.compile(TOTP_SECRETS["sha1"], 30, 8)
+        self.assertIs(engine.compile(TOTP_SECRETS["sha1"], 30, 8), entry)
+        self.assertIsNot(engine.compile(TOTP_SECRETS["sha1"], 60, 8), entry)
+        engine.forget(TOTP_SECRETS["sha1"])
+        self.assertEqual(engine.entries, {})
+        engine.compile(HOTP_SECRET)
+        engine.compile(TOTP_SECRETS["sha256"])
+        engine.retain([HOTP_SECRET])
+        self.assertEqual([key[0] for key in engine.entries], [HOTP_SECRET])
+
+    def test_code_for_config(self):
+        engine = TOTPEngine(clock=lambda: 59)
+        totp = Entry("t", "t", TOTP_SECRETS["sha512"], digits=8, algorithm="sha512")
+        hotp = Entry("h", "h", HOTP_SECRET, counter=7)
+        self.assertEqual(engine.code(totp, totp.secret), TOTP_CODES["sha512"][0])
+        self.assertEqual(engine.code(hotp, hotp.secret), HOTP_CODES[7])
+
+    def test_prepare_only_touches_the_interval_asked_for(self):
+        engine = TOTPEngine()
+        thirty = engine.compile(TOTP_SECRETS["sha1"], 30, 8)
+        sixty = engine.compile(TOTP_SECRETS["sha1"], 60, 8)
+        engine.prepare(1111111109, 30)
+        self.assertEqual(thirty.peek(1111111109 // 30), TOTP_CODES["sha1"][1])
+        self.assertIsNone(sixty.peek(1111111109 // 60))
+
+
+class GenerateCodesTest(unittest.TestCase):
+    def check(self):
+        for algorithm, secret in TOTP_SECRETS.items():
+            counters = [for_time // 30 for for_time in TOTP_TIMES]
+            rows = batch.generate_codes([secret, secret], counters, 8, algorithm, workers=1)
+            with self.subTest(algorithm=algorithm, numpy=batch.np is not None):
+                self.assertEqual(len(rows), 2)
+                for row in rows:
+                    self.assertEqual([str(int(code)).zfill(8) for code in row], TOTP_CODES[algorithm])
+        rows = batch.generate_codes([HOTP_SECRET], list(range(10)), workers=1)
+        self.assertEqual([str(int(code)).zfill(6) for code in rows[0]], HOTP_CODES)
+        self.assertEqual(len(batch.generate_codes([], [1, 2], workers=1)), 0)
+
+    @unittest.skipIf(batch.np is None, "needs NumPy")
+    def test_with_numpy(self):
+        self.check()
+
+    def test_without_numpy(self):
+        with mock.patch.object(batch, "np", None):
+            self.check()
+
+
+if __name__ == "__main__":
+    unittest.main()
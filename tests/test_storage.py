@@ -0,0 +1,221 @@
+import gc
+import os
+import sys
+import json
+import time
+import weakref
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage
+from config import TOTPConfig
+from vault import VAULT_SUFFIX, VaultError
+
+try:
+    import cryptography
+except ImportError:
+    cryptography = None
+
+
+SECRET = "JBSWY3DPEHPK3PXP"
+
+
+class JournalStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # cleanups run last to first, stores opened by a test are closed before this goes
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "totp_config.json")
+        with open(self.path, "w") as f:
+            json.dump([{"name": "a", "secret": SECRET, "prefix": "", "suffix": ""}], f)
+
+    def open(self):
+        config_manager = TOTPConfig(self.path)
+        self.addCleanup(config_manager.store.close)
+        return config_manager
+
+    def names(self):
+        # what a fresh process would see, the writer of the first one may still be running
+        return [config.name for config in TOTPConfig(self.path).configs]
+
+    def test_failed_compaction_does_not_repeat_ops(self):
+        compact = storage.JournalStore.compact
+        calls = []
+
+        def failing_compact(store):
+            calls.append(store)
+            if len(calls) == 1:
+                raise OSError("disk full")
+            compact(store)
+
+        with mock.patch.object(storage, "COMPACT_THRESHOLD", 1), \
+                mock.patch.object(storage.JournalStore, "compact", failing_compact):
+            config_manager = self.open()
+            config_manager.add_config("b", SECRET)
+            config_manager.flush()
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(self.names(), ["a", "b"])
+            config_manager.add_config("c", SECRET)
+            config_manager.flush()
+        self.assertEqual(self.names(), ["a", "b", "c"])
+
+    def test_failed_write_is_retried_once(self):
+        fsync = os.fsync
+        failed = []
+
+        def failing_fsync(fd):
+            if not failed:
+                failed.append(fd)
+                raise OSError("I/O error")
+            fsync(fd)
+
+        config_manager = self.open()
+        config_manager.save_pending_ids()
+        config_manager.flush()
+        with mock.patch.object(storage.os, "fsync", failing_fsync):
+            config_manager.add_config("b", SECRET)
+            config_manager.flush()
+            self.assertIsNotNone(config_manager.store.error)
+            deadline = time.monotonic() + 5
+            while (config_manager.store.error is not None or config_manager.store.pending) and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self.assertEqual(self.names(), ["a", "b"])
+
+    def test_torn_tail_is_cut_before_the_next_write(self):
+        config_manager = self.open()
+        config_manager.add_config("b", SECRET)
+        config_manager.store.close()
+        # close() compacted, start a journal again and tear its last line
+        config_manager = self.open()
+        config_manager.add_config("c", SECRET)
+        config_manager.flush()
+        with open(self.path + storage.JOURNAL_SUFFIX, "a") as f:
+            f.write('{"op": "add", "entry": {"id": "x", "na')
+
+        config_manager = self.open()
+        self.assertEqual([config.name for config in config_manager.configs], ["a", "b", "c"])
+        config_manager.add_config("d", SECRET)
+        config_manager.flush()
+        self.assertEqual(self.names(), ["a", "b", "c", "d"])
+        config_manager.add_config("e", SECRET)
+        config_manager.flush()
+        self.assertEqual(self.names(), ["a", "b", "c", "d", "e"])
+
+    def test_unusable_op_is_cut_before_the_next_write(self):
+        config_manager = self.open()
+        config_manager.save_pending_ids()
+        config_manager.flush()
+        with open(self.path + storage.JOURNAL_SUFFIX, "a") as f:
+            f.write(json.dumps({"op": "delete", "id": "missing"}) + "\n")
+
+        config_manager = self.open()
+        config_manager.add_config("b", SECRET)
+        config_manager.flush()
+        self.assertEqual(self.names(), ["a", "b"])
+
+    def test_copied_id_is_replaced(self):
+        entry = {"id": "abc", "name": "work", "secret": SECRET, "prefix": "", "suffix": ""}
+        with open(self.path, "w") as f:
+            json.dump([entry, dict(entry, name="work-copy")], f)
+        config_manager = self.open()
+        self.assertNotEqual(config_manager.configs[0].id, config_manager.configs[1].id)
+        config_manager.update_config(1, "renamed-copy", SECRET)
+        config_manager.flush()
+        self.assertEqual(self.names(), ["work", "renamed-copy"])
+
+    @unittest.skipIf(cryptography is None, "needs the cryptography package")
+    def test_sealed_copy_still_opens_under_its_new_id(self):
+        config_manager = self.open()
+        config_manager.encrypt("password")
+        config_manager.store.close()
+        with open(self.path) as f:
+            entries = json.load(f)
+        with open(self.path, "w") as f:
+            json.dump(entries + [dict(entries[0], name="copy")], f)
+
+        config_manager = self.open()
+        config_manager.unlock("password")
+        first, copy = config_manager.configs
+        self.assertNotEqual(first.id, copy.id)
+        self.assertEqual(config_manager.secret(copy), SECRET)
+
+    def test_closed_store_is_released(self):
+        config_manager = TOTPConfig(self.path)
+        config_manager.add_config("b", SECRET)
+        config_manager.close()
+        store = weakref.ref(config_manager.store)
+        del config_manager
+        gc.collect()
+        self.assertIsNone(store())
+
+    def write_snapshot(self, entries):
+        # another tool, or a sync client, replacing the file
+        with open(self.path, "w") as f:
+            json.dump(entries, f)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+    def test_local_edits_survive_an_external_snapshot(self):
+        config_manager = self.open()
+        config_manager.add_config("local-edit", SECRET)
+        self.assertTrue(config_manager.flush())
+        first = config_manager.configs[0]
+        self.write_snapshot([first.to_dict(), {"name": "external", "secret": "GEZDGNBVGY3TQOJQ", "prefix": "", "suffix": ""}])
+
+        configs = config_manager.reload_if_changed()
+        config_manager.adopt(configs)
+        self.assertEqual([config.name for config in configs], ["a", "external", "local-edit"])
+        self.assertEqual(config_manager.dropped_edits, 0)
+        config_manager.flush()
+        self.assertEqual(self.names(), ["a", "external", "local-edit"])
+
+    def test_local_edit_of_an_entry_deleted_elsewhere_is_reported(self):
+        config_manager = self.open()
+        config_manager.add_config("b", SECRET)
+        config_manager.update_config(0, "renamed", SECRET)
+        self.assertTrue(config_manager.flush())
+        self.write_snapshot([])
+
+        configs = config_manager.reload_if_changed()
+        self.assertEqual([config.name for config in configs], ["b"])
+        self.assertEqual(config_manager.dropped_edits, 1)
+
+    def test_quiet_journal_is_compacted_into_the_snapshot(self):
+        with mock.patch.object(storage, "COMPACT_DELAY", 0.1):
+            config_manager = self.open()
+            config_manager.add_config("b", SECRET)
+            config_manager.flush()
+            deadline = time.monotonic() + 5
+            while config_manager.store.journal_ops and time.monotonic() < deadline:
+                time.sleep(0.05)
+        # what any other reader of the plain JSON sees
+        with open(self.path) as f:
+            self.assertEqual([entry["name"] for entry in json.load(f)], ["a", "b"])
+
+    @unittest.skipIf(cryptography is None, "needs the cryptography package")
+    def test_decrypt_keeps_the_vault_when_the_write_fails(self):
+        config_manager = self.open()
+        config_manager.encrypt("password")
+        self.assertTrue(config_manager.flush())
+
+        def failing_write(store, ops):
+            raise OSError("I/O error")
+
+        # the retries keep failing while the file is checked, a real failing fsync would race with that check
+        with mock.patch.object(storage.JournalStore, "write", failing_write):
+            with self.assertRaises(VaultError):
+                config_manager.decrypt()
+            self.assertTrue(os.path.exists(self.path + VAULT_SUFFIX))
+            # still sealed on disk, and the vault can open them
+            on_disk = TOTPConfig(self.path)
+            self.assertIsNotNone(on_disk.configs[0].sealed)
+            on_disk.unlock("password")
+            self.assertEqual(on_disk.secret(on_disk.configs[0]), SECRET)
+
+
+if __name__ == "__main__":
+    unittest.main()
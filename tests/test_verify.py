@@ -0,0 +1,100 @@
+import sys
+import json
+import base64
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from engine import CompiledTOTP
+from verify import VerifyService, WindowTable
+
+
+# RFC 6238 sha1 seed, 8 digit codes: 94287082 at 59 s and 07081804 at 1111111109 s
+KEY = b"12345678901234567890"
+TOTP = CompiledTOTP(base64.b32encode(KEY).decode(), 30, 8)
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class WindowTableTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(1111111109)
+        self.table = WindowTable({"a": KEY, "b": KEY}, skew=1, clock=self.clock, digits=8)
+        self.counter = self.table.current()
+
+    def code(self, offset=0):
+        return TOTP.code(self.counter + offset)
+
+    def test_rfc_code_is_accepted(self):
+        self.assertEqual(self.code(), "07081804")
+        self.assertEqual(self.table.verify("a", "07081804"), "ok")
+
+    def test_replay_within_the_window(self):
+        self.assertEqual(self.table.verify("a", self.code()), "ok")
+        self.assertEqual(self.table.verify("a", self.code()), "replayed")
+        # the cache is per entry, the same code for another entry is its own first use
+        self.assertEqual(self.table.verify("b", self.code()), "ok")
+        self.clock.now += 30
+        self.assertEqual(self.table.verify("a", self.code()), "replayed")
+
+    def test_code_expires_with_its_column(self):
+        code = self.code()
+        self.clock.now += 30 * 2
+        self.table.slide(self.table.current())
+        self.assertEqual(self.table.verify("a", code), "invalid")
+        self.assertNotIn(self.counter, self.table.used)
+
+    def test_skew_bounds(self):
+        self.assertEqual(self.table.verify("a", self.code(-1)), "ok")
+        self.assertEqual(self.table.verify("a", self.code(1)), "ok")
+        self.assertEqual(self.table.verify("a", self.code(-2)), "invalid")
+        # the look-ahead column is computed, but not yet accepted
+        self.assertEqual(self.table.verify("a", self.code(2)), "invalid")
+
+    def test_table_slides_when_asked_after_a_boundary(self):
+        self.clock.now += 30 * 5
+        self.counter += 5
+        self.assertEqual(self.table.verify("a", self.code()), "ok")
+
+    def test_numeric_code_keeps_its_leading_zero(self):
+        self.assertEqual(self.table.verify("a", 7081804), "ok")
+        self.assertEqual(self.table.verify("a", "7081804"), "invalid")
+
+    def test_unknown_entry(self):
+        self.assertEqual(self.table.verify("missing", self.code()), "unknown")
+
+
+class VerifyServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(59)
+        self.service = VerifyService([WindowTable({"a": KEY}, clock=self.clock, digits=8)])
+
+    def answer(self, message):
+        return self.service.answer(json.dumps(message).encode())
+
+    def test_single_and_bulk(self):
+        self.assertEqual(self.answer({"id": "a", "code": "94287082"}), {"ok": True, "result": "ok"})
+        self.assertEqual(self.answer({"verify": [["a", "94287082"], ["a", "00000000"], ["x", "94287082"]]}),
+                         {"results": ["replayed", "invalid", "unknown"]})
+
+    def test_malformed_requests(self):
+        for line in [b"not json", b"[1]", b"5", b'"a"', b'{"id": "a"}', b'{"code": "94287082"}',
+                     b'{"id": "a", "code": null}', b'{"id": "a", "code": true}', b'{"verify": [["a"]]}',
+                     b'{"verify": 1}']:
+            with self.subTest(line=line):
+                response = self.service.answer(line)
+                self.assertFalse(response["ok"])
+                self.assertEqual(response["result"], "error")
+        # nothing above counted as a use
+        self.assertEqual(self.answer({"id": "a", "code": "94287082"})["result"], "ok")
+
+
+if __name__ == "__main__":
+    unittest.main()
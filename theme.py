@@ -0,0 +1,114 @@
+import os
+import json
+import shutil
+import hashlib
+from pathlib import Path
+from PyQt5.QtCore import QDir
+from PyQt5.QtGui import QColor, QFontDatabase, QGuiApplication, QPalette
+import stats
+
+
+THEME = "dark_teal.xml"
+CACHE_DIR = Path.home() / ".cache" / "aidex" / "theme"
+
+# appended to the qt_material sheet, scoped to the popup so dialogs keep the plain theme
+APP_STYLESHEET = """
+MainApp QPushButton {
+    font-size: 14px; border-radius: 12px;
+}
+MainApp QPushButton:hover {
+    border: 2px solid #00ffdf; color: #00ffdf;
+}
+MainApp QTableView {
+    border: 0px; font-size: 15px; border-radius: 15px; margin: 1px;
+}
+MainApp QHeaderView::section {
+    font-size: 13px;
+}
+MainApp QTableView::item {
+    border-bottom: 0.5px solid #B3B3B3; padding: 5px;
+}
+MainApp QHeaderView::section:first {
+    border-top-left-radius: 7px;
+}
+MainApp QHeaderView::section:last {
+    border-top-right-radius: 7px;
+}
+"""
+
+
+def qt_material_version():
+    try:
+        from importlib.metadata import version
+        return version("qt-material")
+    except Exception:
+        return "unknown"
+
+
+def cache_dir():
+    digest = hashlib.sha256((THEME + APP_STYLESHEET).encode()).hexdigest()[:12]
+    return CACHE_DIR / f"{qt_material_version()}-{Path(THEME).stem}-{digest}"
+
+
+def set_placeholder_color(color):
+    # what qt_material does to the palette, placeholders in the primary color at low alpha
+    palette = QGuiApplication.palette()
+    placeholder = QColor(color)
+    placeholder.setAlpha(92)
+    palette.setColor(QPalette.PlaceholderText, placeholder)
+    QGuiApplication.setPalette(palette)
+
+
+def load_cached(app, directory):
+    try:
+        with open(directory / "meta.json") as f:
+            meta = json.load(f)
+        with open(directory / "stylesheet.qss") as f:
+            stylesheet = f.read()
+    except (OSError, ValueError):
+        return False
+    if not all(os.path.exists(path) for path in [meta["icons"], meta["resources"], *meta["fonts"]]):
+        return False
+    QDir.addSearchPath("icon", meta["icons"])
+    QDir.addSearchPath("qt_material", meta["resources"])
+    for font in meta["fonts"]:
+        QFontDatabase.addApplicationFont(font)
+    set_placeholder_color(meta["primary"])
+    app.setStyleSheet(stylesheet)
+    return True
+
+
+def build(app, directory):
+    # the expensive path: renders the template and writes every themed icon, once per cache key
+    import qt_material
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+    icons = str(directory / "icons")
+    stylesheet = qt_material.build_stylesheet(THEME, parent=icons) + APP_STYLESHEET
+    package = Path(qt_material.__file__).parent
+    fonts = sorted(str(path) for path in (package / "fonts" / "roboto").glob("*.ttf"))
+    meta = {"icons": icons, "resources": str(package / "resources"), "fonts": fonts,
+            "primary": qt_material.get_theme(THEME)["primaryColor"]}
+    app.setStyleSheet(stylesheet)
+
+    with open(directory / "stylesheet.qss", "w") as f:
+        f.write(stylesheet)
+    # written last, a cache without it is incomplete and gets rebuilt
+    tmp_path = directory / "meta.json.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=4)
+    os.replace(tmp_path, directory / "meta.json")
+
+
+@stats.timed("theme_ms")
+def apply_theme(app):
+    directory = cache_dir()
+    if load_cached(app, directory):
+        return
+    try:
+        build(app, directory)
+    except OSError:
+        # a read-only home still gets the theme, just without the cache
+        import qt_material
+        qt_material.apply_stylesheet(app, theme=THEME)
+        app.setStyleSheet(app.styleSheet() + APP_STYLESHEET)
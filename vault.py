@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import time
+import base64
+import getpass
+import hashlib
+import argparse
+
+
+VAULT_SUFFIX = ".vault"
+# scrypt cost, roughly 32 MiB and a few hundred ms, paid once per unlock and never per entry
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_MAXMEM = 2 ** 26
+# the derived key is dropped after this many seconds without use
+IDLE_TIMEOUT = 300
+# how often the tray app looks for a vault that idled out, so keys do not wait for the next use to go
+IDLE_CHECK = 30
+CHECK = b"aidex"
+
+
+class VaultError(Exception):
+    pass
+
+
+class VaultLocked(VaultError):
+    pass
+
+
+def b64encode(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+# The vault file next to the config only holds the KDF parameters and a check value,
+# entries stay in the config file with their secret sealed one by one under the derived
+# key (AES-GCM, the entry id as associated data). Names are left in the clear so the list
+# and search work without unlocking.
+class Vault:
+    def __init__(self, path, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.header = None
+        self.aead = None
+        self.last_used = 0.0
+        try:
+            with open(path, "r") as f:
+                self.header = json.load(f)
+        except FileNotFoundError:
+            pass
+
+    def reload(self):
+        # a vault synced from elsewhere may come with a new salt, the cached key is useless then
+        try:
+            with open(self.path, "r") as f:
+                header = json.load(f)
+        except FileNotFoundError:
+            header = None
+        if header != self.header:
+            self.header = header
+            self.lock()
+
+    @property
+    def exists(self):
+        return self.header is not None
+
+    def derive(self, password, header):
+        # imported here, unencrypted configs and the IPC client never pay for it
+        try:
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        except ImportError:
+            raise VaultError("encrypted vaults need the cryptography package") from None
+        key = hashlib.scrypt(password.encode("utf-8"), salt=base64.b64decode(header["salt"]),
+                             n=header["n"], r=header["r"], p=header["p"], maxmem=SCRYPT_MAXMEM, dklen=32)
+        return AESGCM(key)
+
+    def create(self, password):
+        header = {"version": 1, "kdf": "scrypt", "salt": b64encode(os.urandom(16)),
+                  "n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P}
+        aead = self.derive(password, header)
+        nonce = os.urandom(12)
+        header["check"] = b64encode(nonce + aead.encrypt(nonce, CHECK, b"check"))
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(header, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.header = header
+        self.aead = aead
+        self.last_used = self.clock()
+
+    def remove(self):
+        self.lock()
+        self.header = None
+        os.remove(self.path)
+
+    def unlock(self, password):
+        if not self.exists:
+            raise VaultError("there is no vault to unlock")
+        from cryptography.exceptions import InvalidTag
+        aead = self.derive(password, self.header)
+        data = base64.b64decode(self.header["check"])
+        try:
+            aead.decrypt(data[:12], data[12:], b"check")
+        except InvalidTag:
+            raise VaultError("wrong password") from None
+        self.aead = aead
+        self.last_used = self.clock()
+
+    def lock(self):
+        self.aead = None
+
+    def active(self):
+        # counts as a use, so only a vault left alone for IDLE_TIMEOUT locks itself
+        if self.aead is None:
+            return False
+        now = self.clock()
+        if now - self.last_used > IDLE_TIMEOUT:
+            self.aead = None
+            return False
+        self.last_used = now
+        return True
+
+    def idle_out(self):
+        # locks a vault left alone for IDLE_TIMEOUT without counting as a use, -> True if it did
+        if self.aead is not None and self.clock() - self.last_used > IDLE_TIMEOUT:
+            self.aead = None
+            return True
+        return False
+
+    def seal(self, entry_id, secret):
+        if not self.active():
+            raise VaultLocked("the vault is locked")
+        nonce = os.urandom(12)
+        return b64encode(nonce + self.aead.encrypt(nonce, secret.encode("utf-8"), entry_id.encode("ascii")))
+
+    def open(self, entry_id, sealed):
+        if not self.active():
+            raise VaultLocked("the vault is locked")
+        from cryptography.exceptions import InvalidTag
+        # a copy given a new id keeps the id it was sealed under in front, see TOTPConfig.assign_ids
+        sealed_id, _, sealed = sealed.rpartition(":")
+        data = base64.b64decode(sealed)
+        try:
+            return self.aead.decrypt(data[:12], data[12:], (sealed_id or entry_id).encode("ascii")).decode("utf-8")
+        except InvalidTag:
+            raise VaultError(f"entry {entry_id} does not decrypt") from None
+
+
+def unlock_from_terminal(config_manager):
+    # for the command line paths, the tray app asks with a dialog instead
+    if config_manager.needs_unlock():
+        config_manager.unlock(getpass.getpass("Vault password: "))
+
+
+def main(argv=None):
+    from config import CONFIG_FILE, TOTPConfig
+    parser = argparse.ArgumentParser(prog="aidex vault", description="Encrypt or decrypt the secrets in a config file.")
+    parser.add_argument("action", choices=["encrypt", "decrypt"])
+    parser.add_argument("--config", default=CONFIG_FILE, help="config file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    config_manager = TOTPConfig(args.config)
+    try:
+        if args.action == "encrypt":
+            if config_manager.vault.exists:
+                print("the config is already encrypted", file=sys.stderr)
+                return 1
+            password = getpass.getpass("New vault password: ")
+            if not password or password != getpass.getpass("Repeat password: "):
+                print("passwords are empty or do not match", file=sys.stderr)
+                return 1
+            config_manager.encrypt(password)
+        else:
+            if not config_manager.vault.exists:
+                print("the config is not encrypted", file=sys.stderr)
+                return 1
+            unlock_from_terminal(config_manager)
+            config_manager.decrypt()
+    except VaultError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        config_manager.close()
+    return 0
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import zlib
+import base64
+import asyncio
+import getpass
+import binascii
+import argparse
+import tempfile
+import multiprocessing
+from collections import deque
+
+import stats
+from batch import compute_block
+from engine import DEFAULT_INTERVAL, DEFAULT_DIGITS, DEFAULT_ALGORITHM, ALGORITHMS
+
+
+DEFAULT_SKEW = 1
+
+
+def socket_base():
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = str(os.getuid())
+    return os.path.join(tempfile.gettempdir(), f"aidex-verify-{user}.sock")
+
+
+def shard_for(entry_id, shards):
+    # clients route each id to the shard that owns it with the same hash
+    return zlib.crc32(entry_id.encode()) % shards
+
+
+def shard_path(base, shard):
+    return f"{base}.{shard}"
+
+
+# Codes for every entry over [counter - skew, counter + skew + 1], one column per counter,
+# the extra column ahead means a boundary never waits on HMACs. Accepted (id, counter) pairs
+# are kept per counter and expire together with their column, which is the replay cache's TTL.
+class WindowTable:
+    def __init__(self, entries, skew=DEFAULT_SKEW, clock=time.time, interval=DEFAULT_INTERVAL, digits=DEFAULT_DIGITS,
+                 algorithm=DEFAULT_ALGORITHM):
+        # entries: {id: raw key bytes}, all with the same interval, digits and algorithm
+        self.ids = list(entries)
+        self.keys = [entries[entry_id] for entry_id in self.ids]
+        self.skew = skew
+        self.clock = clock
+        self.interval = interval
+        self.digits = digits
+        self.algorithm = algorithm
+        self.codes = {entry_id: {} for entry_id in self.ids}
+        self.columns = deque()
+        self.used = {}
+        self.counter = None
+        self.slide(self.current())
+
+    def current(self):
+        return int(self.clock() // self.interval)
+
+    def slide(self, counter):
+        lo, hi = counter - self.skew, counter + self.skew + 1
+        while self.columns and self.columns[0][0] < lo:
+            old, column = self.columns.popleft()
+            for codes, code in zip(self.codes.values(), column):
+                if codes.get(code) == old:
+                    del codes[code]
+            self.used.pop(old, None)
+        first = self.columns[-1][0] + 1 if self.columns else lo
+        counters = list(range(max(first, lo), hi + 1))
+        if counters and self.keys:
+            start = time.perf_counter()
+            block = compute_block(self.keys, counters, self.digits, self.algorithm)
+            rows = block.tolist() if hasattr(block, "tolist") else block
+            for offset, counter_at in enumerate(counters):
+                column = [f"{row[offset]:0{self.digits}d}" for row in rows]
+                # a code repeated within the window maps to its newest counter, dropping the old column skips it
+                for codes, code in zip(self.codes.values(), column):
+                    codes[code] = counter_at
+                self.columns.append((counter_at, column))
+            if stats.enabled:
+                stats.record("verify_slide_ms", (time.perf_counter() - start) * 1000)
+        self.counter = counter
+
+    def verify(self, entry_id, code):
+        codes = self.codes.get(entry_id)
+        if codes is None:
+            return "unknown"
+        if not isinstance(code, str):
+            if not isinstance(code, int) or isinstance(code, bool):
+                raise TypeError("code must be a string")
+            # a JSON number has lost the code's leading zeros
+            code = str(code).zfill(self.digits)
+        now = self.current()
+        if now != self.counter:
+            # the boundary task normally got here first
+            self.slide(now)
+        counter = codes.get(code)
+        if counter is None or abs(counter - now) > self.skew:
+            return "invalid"
+        used = self.used.setdefault(counter, set())
+        if entry_id in used:
+            return "replayed"
+        used.add(entry_id)
+        return "ok"
+
+    async def slide_forever(self):
+        while True:
+            await asyncio.sleep(self.interval - self.clock() % self.interval)
+            self.slide(self.current())
+
+
+class VerifyService:
+    # newline-delimited JSON: {"id": ..., "code": ...} -> {"ok": bool, "result": ...},
+    # or {"verify": [[id, code], ...]} -> {"results": [...]} for pipelined bulk checks
+    def __init__(self, tables):
+        # one table per interval, digits and algorithm in use
+        self.tables = {entry_id: table for table in tables for entry_id in table.ids}
+
+    def verify(self, entry_id, code):
+        table = self.tables.get(entry_id)
+        if table is None:
+            return "unknown"
+        return table.verify(entry_id, code)
+
+    def answer(self, line):
+        try:
+            message = json.loads(line)
+            if "verify" in message:
+                verify = self.verify
+                return {"results": [verify(entry_id, code) for entry_id, code in message["verify"]]}
+            result = self.verify(message["id"], message["code"])
+        except (ValueError, KeyError, TypeError) as e:
+            return {"ok": False, "result": "error", "error": str(e)}
+        return {"ok": result == "ok", "result": result}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(json.dumps(self.answer(line)).encode() + b"\n")
+                await writer.drain()
+                if stats.enabled:
+                    stats.count("verify_requests")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(path, tables):
+    if os.path.exists(path):
+        os.remove(path)
+    service = VerifyService(tables)
+    # the socket is created owner-only, a chmod after the bind leaves a window where anyone can connect
+    umask = os.umask(0o077)
+    try:
+        server = await asyncio.start_unix_server(service.handle_connection, path, limit=1 << 20)
+    finally:
+        os.umask(umask)
+    sliders = [asyncio.ensure_future(table.slide_forever()) for table in tables]
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for slider in sliders:
+            slider.cancel()
+
+
+def run_shard(path, groups, skew):
+    # process entry point, must stay importable at module level for spawn
+    tables = [WindowTable(entries, skew, interval=interval, digits=digits, algorithm=algorithm)
+              for (interval, digits, algorithm), entries in groups.items()]
+    try:
+        asyncio.run(serve(path, tables))
+    except KeyboardInterrupt:
+        pass
+
+
+def load_entries(config_path):
+    from config import TOTPConfig
+    from vault import VaultError, unlock_from_terminal
+    config_manager = TOTPConfig(config_path)
+    unlock_from_terminal(config_manager)
+    # {(interval, digits, algorithm): {id: raw key bytes}}
+    groups = {}
+    for config in config_manager.configs:
+        if config.counter is not None:
+            # the counter lives in the config file, a shard cannot move it
+            print(f"skipping {config.name!r}: HOTP entries are not served", file=sys.stderr)
+            continue
+        if config.algorithm not in ALGORITHMS:
+            print(f"skipping {config.name!r}: unsupported algorithm {config.algorithm!r}", file=sys.stderr)
+            continue
+        try:
+            key = base64.b32decode(config_manager.secret(config), casefold=True)
+        except (binascii.Error, VaultError):
+            print(f"skipping {config.name!r}: invalid secret", file=sys.stderr)
+            continue
+        groups.setdefault((config.interval, config.digits, config.algorithm), {})[config.id] = key
+    return groups
+
+
+def start_shards(base, groups, shards, skew):
+    parts = [{} for _ in range(shards)]
+    for params, entries in groups.items():
+        for entry_id, key in entries.items():
+            parts[shard_for(entry_id, shards)].setdefault(params, {})[entry_id] = key
+    processes = []
+    for shard, part in enumerate(parts):
+        process = multiprocessing.Process(target=run_shard, args=(shard_path(base, shard), part, skew),
+                                          name=f"aidex-verify-{shard}", daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def main(argv=None):
+    from config import CONFIG_FILE
+    from vault import VaultError
+    parser = argparse.ArgumentParser(prog="aidex verify", description="Serve TOTP verification for the configured entries.")
+    parser.add_argument("--config", default=CONFIG_FILE, help="config file to read (default: %(default)s)")
+    parser.add_argument("--socket", default=socket_base(), help="socket path prefix, shard N listens on PREFIX.N")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per core)")
+    parser.add_argument("--skew", type=int, default=DEFAULT_SKEW, help="accepted time steps before and after now")
+    args = parser.parse_args(argv)
+    if not hasattr(asyncio, "start_unix_server"):
+        print("verify mode needs Unix domain sockets", file=sys.stderr)
+        return 1
+
+    try:
+        groups = load_entries(args.config)
+    except VaultError as e:
+        print(e, file=sys.stderr)
+        return 1
+    processes = start_shards(args.socket, groups, args.shards, args.skew)
+    count = sum(len(entries) for entries in groups.values())
+    print(f"verifying {count} entries on {shard_path(args.socket, 0)}..{args.shards - 1}", file=sys.stderr)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+    return 0
@@ -0,0 +1,42 @@
+import os
+from PyQt5.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+
+
+# sync tools and editors touch the file several times per save, wait for them to settle
+DEBOUNCE_MS = 300
+
+
+class ConfigWatcher(QObject):
+    changed = pyqtSignal()
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = os.path.abspath(path)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_change)
+        self.watcher.directoryChanged.connect(self.on_change)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DEBOUNCE_MS)
+        self.timer.timeout.connect(self.changed)
+
+    def set_path(self, path):
+        # another vault came on screen, only its file is watched from now on
+        paths = self.watcher.files() + self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
+        self.path = os.path.abspath(path)
+        self.start()
+
+    def start(self):
+        # the directory catches files replaced by rename, which drops them from the file watch
+        self.watcher.addPath(os.path.dirname(self.path))
+        self.watch_file()
+
+    def watch_file(self):
+        if os.path.exists(self.path) and self.path not in self.watcher.files():
+            self.watcher.addPath(self.path)
+
+    def on_change(self, path):
+        self.watch_file()
+        self.timer.start()